@@ -1,29 +1,107 @@
-from flask import Flask, jsonify
-from config import Config
-from services.database_service import init_db, mongo
-from routes.auth_routes import auth_bp
-from routes.gig_routes import gig_bp
-from routes.payment_routes import payment_bp
+from services.startup_profile import startup_step, timed_import, get_startup_profile, log_startup_profile
+with startup_step('import flask, config'):
+    from flask import Flask, jsonify
+    from config import Config
 import logging
+import click
 
 def create_app():
+    """
+    Builds the app. Only what the first request needs happens here: MongoDB connections, index bootstrap and
+    the first listing query are left to the warm-up (services/readiness_service.py), which runs in the
+    background when WARMUP_ON_START and is reported by GET /ready. STARTUP_PROFILE=true logs each step's time.
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
 
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     app.logger.setLevel(logging.INFO)
 
-    init_db(app)
+    database_service = timed_import('services.database_service')
+    cache_service = timed_import('services.cache_service')
+    json_provider = timed_import('services.json_provider')
+    metrics_service = timed_import('services.metrics_service')
+    readiness_service = timed_import('services.readiness_service')
+    auth_routes = timed_import('routes.auth_routes')
+    gig_routes = timed_import('routes.gig_routes')
+    payment_routes = timed_import('routes.payment_routes')
+    from services.ai_service import get_ai_call_stats
+    from services.password_service import get_hash_stats
+    from services.quiz_job_service import get_quiz_job_stats
 
-    app.register_blueprint(auth_bp, url_prefix='/api/auth')
-    app.register_blueprint(gig_bp, url_prefix='/api/gigs')
-    app.register_blueprint(payment_bp, url_prefix='/api/payments')
+    with startup_step('init_db'):
+        # Only configures the client, MongoClient connects in the background
+        database_service.init_db(app)
+    # Must come after init_db: Flask-PyMongo's init_app installs its own BSONProvider, which encodes ObjectIds
+    # as {"$oid": ...} instead of the plain strings the API returns
+    app.json = json_provider.MongoJSONProvider(app)
+    with startup_step('init caches and metrics'):
+        cache_service.user_cache.init_app(app)
+        cache_service.dashboard_cache.init_app(app)
+        metrics_service.init_metrics(app, stat_sources=[
+            ('cashngo_ai_calls', 'AI provider call totals for this worker.', get_ai_call_stats),
+            ('cashngo_quiz_jobs', 'Quiz generation admission and coalescing counters for this worker.', get_quiz_job_stats),
+            ('cashngo_password_hashing', 'Password hashing totals for this worker.', get_hash_stats),
+            ('cashngo_user_cache', 'Authenticated-user cache counters for this worker.', cache_service.user_cache.stats),
+            ('cashngo_dashboard_cache', 'Employer dashboard cache counters for this worker.', cache_service.dashboard_cache.stats),
+            ('cashngo_startup_seconds', 'Time spent in each create_app step in this worker.', get_startup_profile),
+        ])
+
+    auth_bp, gig_bp, payment_bp = auth_routes.auth_bp, gig_routes.gig_bp, payment_routes.payment_bp
+    with startup_step('register blueprints'):
+        app.register_blueprint(auth_bp, url_prefix='/api/auth')
+        app.register_blueprint(gig_bp, url_prefix='/api/gigs')
+        app.register_blueprint(payment_bp, url_prefix='/api/payments')
 
     # Welcome Endpoint, Made by me to be used to create a cron-job to avoid system spinnig down with downtime
     @app.route('/')
     def index():
         return jsonify({"message": "Welcome to CashnGo Backend API!"})
 
+    # Readiness: warm MongoDB pool and indexes, 503 until then. Point health checks (and the cron job) here.
+    @app.route('/ready')
+    def ready():
+        is_ready, details = readiness_service.check_ready(app)
+        return jsonify(details), 200 if is_ready else 503
+
+    # Backfills normalized skill keys and the badge -> skill tag unlock index for existing data
+    @app.cli.command('rebuild-skill-index')
+    def rebuild_skill_index():
+        from models.skill import SkillIndex
+        badge_count = SkillIndex.rebuild()
+        print(f"Skill unlock index rebuilt for {badge_count} badges.")
+
+    # Indexes gigs stored before the recommendation index existed (or re-weighs all of them)
+    @app.cli.command('rebuild-recommendations')
+    def rebuild_recommendations():
+        from models.gig import Gig
+        print(f"Recommendation terms updated on {Gig.rebuild_recommendation_terms()} gigs.")
+
+    # Finishes or undoes payouts a crashed worker left SETTLING (only happens without transactions)
+    @app.cli.command('recover-settlements')
+    @click.option('--older-than', default=300, show_default=True, help='Only settlements started this many seconds ago or earlier.')
+    def recover_settlements_command(older_than):
+        from services.payment_service import recover_settlements
+        counts = recover_settlements(older_than)
+        print(f"Settlements rolled forward: {counts['PAID']}, rolled back: {counts['ESCROWED']}, "
+              f"untagged SETTLING gigs to check by hand: {counts['unresolved']}.")
+
+    # Converts quiz and quiz job dates stored as strings, so the TTL indexes expire those documents too
+    @app.cli.command('backfill-quiz-dates')
+    def backfill_quiz_dates():
+        from services.index_service import backfill_dates
+        for collection_name, count in backfill_dates().items():
+            print(f"Converted {count} dates on {collection_name}.")
+
+    # Creates the indexes declared on the models, then reports any query shape left without one
+    @app.cli.command('ensure-indexes')
+    def ensure_indexes_command():
+        from services.index_service import ensure_indexes, verify_indexes
+        for index_name in ensure_indexes():
+            print(f"Index ready: {index_name}")
+        if verify_indexes():
+            print("Every declared query shape has a supporting index.")
+
     # Error Handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -40,7 +118,10 @@ def create_app():
 
     app.config['MOCK_VERIFICATION'] = True 
 
-
+    if app.config['WARMUP_ON_START']:
+        readiness_service.start_warmup(app)
+    if app.config['STARTUP_PROFILE']:
+        log_startup_profile(app.logger)
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,55 @@
+"""
+Cold start: time from a fresh interpreter to the app answering its first request.
+
+Each run starts a new Python process that imports app, calls create_app() and sends GET / through the test
+client, then prints its startup profile (see services/startup_profile.py). MongoDB is not contacted: the
+client connects lazily and warm-up is disabled, so this measures imports and initialization only.
+
+    python benchmarks/cold_start.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+created = time.perf_counter()
+app.test_client().get('/')
+first_request = time.perf_counter()
+from services.startup_profile import get_startup_profile
+print(json.dumps({'create_app_seconds': created - started, 'first_request_seconds': first_request - started,
+                  'steps': get_startup_profile()}))
+"""
+
+
+def run_once():
+    env = dict(os.environ, WARMUP_ON_START='false', MONGO_URI=os.environ.get('MONGO_URI', 'mongodb://127.0.0.1:27017/cashngo_bench'))
+    output = subprocess.check_output([sys.executable, '-c', CHILD], cwd=ROOT, env=env, text=True, stderr=subprocess.DEVNULL)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    steps = {name: statistics.median(run['steps'].get(name, 0.0) for run in runs) for name in runs[0]['steps']}
+    print(json.dumps({
+        'runs': args.runs,
+        'create_app_ms_median': round(statistics.median(run['create_app_seconds'] for run in runs) * 1000, 1),
+        'first_request_ms_median': round(statistics.median(run['first_request_seconds'] for run in runs) * 1000, 1),
+        'step_ms_median': {name: round(seconds * 1000, 1) for name, seconds in sorted(steps.items(), key=lambda step: -step[1])},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""
+Endpoint benchmark suite.
+
+Builds create_app() against a local mongod (--mongo-uri) or, by default, an in-process mongomock stand-in
+(`pip install mongomock`), with a stub OpenRouter server on localhost in place of the AI provider. Seeds
+employers, gigs per employer and students with badges, then drives each endpoint through the Flask test
+client and reports throughput and p50/p95/p99 latency per endpoint as JSON:
+
+    python benchmarks/endpoints.py --output bench.json
+    python benchmarks/endpoints.py --output after.json --compare bench.json
+
+The output records the git commit so runs can be compared across commits. mongomock is handy for quick,
+dependency-free comparisons; use a real mongod for absolute numbers (indexes, transactions, network).
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SKILLS = ('Graphic Design', 'Python', 'Copywriting', 'Video Editing', 'Data Entry', 'Excel')
+PASSWORD = 'bench-password'
+
+STUB_QUIZ = {
+    'quiz_id': 'stub',
+    'skill_name': 'Python',
+    'questions': [
+        {'text': f'Question {i}?', 'options': ['a', 'b', 'c', 'd'], 'correct_answer_index': i % 4}
+        for i in range(3)
+    ]
+}
+
+
+class StubOpenRouter(BaseHTTPRequestHandler):
+    """Answers /chat/completions like OpenRouter, after --ai-latency seconds."""
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency)
+        body = json.dumps({'choices': [{'message': {'content': json.dumps(STUB_QUIZ)}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_openrouter(latency):
+    StubOpenRouter.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenRouter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/api/v1"
+
+
+def build_app(args, ai_base_url):
+    os.environ['MONGO_URI'] = args.mongo_uri or 'mongodb://127.0.0.1:27017/cashngo_bench'
+    os.environ.setdefault('SECRET_KEY', 'bench-secret')
+    os.environ['OPEN_API_KEY'] = 'stub'
+    os.environ['AI_BASE_URL'] = ai_base_url
+    os.environ['MONGO_ENSURE_INDEXES'] = 'true' if args.mongo_uri else 'false'
+    os.environ['WARMUP_ON_START'] = 'false'
+
+    from app import create_app
+    from services import database_service, readiness_service
+    app = create_app()
+    if args.mongo_uri:
+        readiness_service.warm_up(app)
+    else:
+        import mongomock
+        database_service.mongo.cx = mongomock.MongoClient()
+        database_service.mongo.db = database_service.mongo.cx['cashngo_bench']
+        # mongomock has no replica set, settle payments through the non-transactional path
+        database_service._supports_transactions = False
+    return app
+
+
+def seed(app, args):
+    from services.database_service import get_db
+    from models.user import User
+    from models.gig import Gig
+    from models.skill import SkillIndex, normalize_skill_tag
+    from models.quiz_bank import QuizBank
+    from bson.objectid import ObjectId
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db = get_db()
+        for name in ('users', 'gigs', 'quizzes', 'quiz_jobs', 'quiz_bank', 'skill_unlocks'):
+            db[name].delete_many({})
+        password_hash = User.hash_password(PASSWORD)
+        now = datetime.datetime.utcnow()
+
+        employers, students, gigs = [], [], []
+        for e in range(args.employers):
+            employers.append({'_id': ObjectId(), 'username': f'employer{e}', 'email': f'employer{e}@bench.test',
+                              'password_hash': password_hash, 'role': 'Employer', 'primary_skill': None,
+                              'badges': [], 'badge_keys': [], 'wallet_balance': 1e9, 'committed_balance': 0.0,
+                              'verification_status': 'Verified'})
+        for s in range(args.students):
+            badges = rng.sample(SKILLS, min(args.badges_per_student, len(SKILLS)))
+            students.append({'_id': ObjectId(), 'username': f'student{s}', 'email': f'student{s}@bench.test',
+                             'password_hash': password_hash, 'role': 'Student', 'primary_skill': rng.choice(SKILLS),
+                             'badges': badges, 'badge_keys': sorted({normalize_skill_tag(b) for b in badges}),
+                             'wallet_balance': 0.0, 'committed_balance': 0.0, 'verification_status': 'Verified'})
+
+        escrowed = []
+        for employer in employers:
+            for g in range(args.gigs_per_employer):
+                skill = rng.choice(SKILLS)
+                status = 'ESCROWED' if g < args.escrowed_per_employer else rng.choice(('POSTED', 'PAID'))
+                price = float(rng.randint(5, 500))
+                gig = {'_id': ObjectId(), 'title': f'{skill} gig {g}', 'description': f'Help needed with {skill}.',
+                       'price': price, 'required_skill_tag': skill, 'skill_key': normalize_skill_tag(skill),
+                       'employer_id': str(employer['_id']), 'status': status, 'applied_students': [],
+                       'claimed_by': str(rng.choice(students)['_id']) if status != 'POSTED' else None,
+                       'created_at': (now - datetime.timedelta(seconds=len(gigs))).isoformat()}
+                if status in ('POSTED', 'ESCROWED'):
+                    employer['committed_balance'] += price
+                if status == 'ESCROWED':
+                    escrowed.append(gig)
+                gigs.append(gig)
+
+        db['users'].insert_many(employers + students)
+        for gig in gigs:
+            gig['rec_terms'] = Gig.from_dict(gig).recommendation_terms()
+        db['gigs'].insert_many(gigs)
+        for skill in SKILLS:
+            SkillIndex.register_badge(normalize_skill_tag(skill))
+            for student_skill in SKILLS:
+                QuizBank.add_variant(QuizBank.bank_key(student_skill, skill), STUB_QUIZ)
+    return employers, students, escrowed
+
+
+def login(client, email):
+    response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+    return response.get_json()['token']
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_endpoint(name, requests_iter):
+    """requests_iter yields callables, each making one request and returning the response."""
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for make_request in requests_iter:
+        request_started = time.perf_counter()
+        response = make_request()
+        latencies.append(time.perf_counter() - request_started)
+        if response.status_code >= 400:
+            errors += 1
+    total = time.perf_counter() - started
+    latencies.sort()
+    return name, {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / total, 1) if total else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def check_json_encoding(app, client, token):
+    """Listings must go through MongoJSONProvider, which returns ObjectIds as plain strings (see API-DOCS.md)."""
+    from services.json_provider import MongoJSONProvider
+    if not isinstance(app.json, MongoJSONProvider):
+        raise SystemExit(f"app.json is {type(app.json).__name__}, not MongoJSONProvider.")
+    gigs = client.get('/api/gigs/?limit=1', headers={'x-access-token': token}).get_json()['gigs']
+    if gigs and not isinstance(gigs[0]['_id'], str):
+        raise SystemExit(f"Listed gig _id is encoded as {gigs[0]['_id']!r}, not a string.")
+
+
+def run_suite(app, args, employers, students, escrowed):
+    client = app.test_client()
+    rng = random.Random(args.seed)
+    n = args.requests
+    employer_tokens = {str(e['_id']): login(client, e['email']) for e in employers[:max(1, min(len(employers), 20))]}
+    student_tokens = [login(client, s['email']) for s in students[:max(1, min(len(students), 20))]]
+    any_employer = list(employer_tokens.values())
+
+    def get(path, token):
+        return lambda: client.get(path, headers={'x-access-token': token})
+
+    def post(path, token, body):
+        return lambda: client.post(path, json=body, headers={'x-access-token': token})
+
+    check_json_encoding(app, client, student_tokens[0])
+    approvable = [gig for gig in escrowed if str(gig['employer_id']) in employer_tokens]
+    suite = [
+        ('GET /api/gigs (student)', (get('/api/gigs/?limit=20', rng.choice(student_tokens)) for _ in range(n))),
+        ('GET /api/gigs (unlocked_only)', (get('/api/gigs/?limit=20&unlocked_only=true', rng.choice(student_tokens)) for _ in range(n))),
+        ('GET /api/gigs/recommended', (get('/api/gigs/recommended?limit=20', rng.choice(student_tokens)) for _ in range(n))),
+        ('GET /api/payments/wallet', (get('/api/payments/wallet', rng.choice(student_tokens)) for _ in range(n))),
+        ('POST /api/gigs', (post('/api/gigs/', rng.choice(any_employer), {
+            'title': 'Bench gig', 'description': 'Benchmark', 'price': 10, 'required_skill_tag': rng.choice(SKILLS)
+        }) for _ in range(n))),
+        ('POST /api/auth/login', ((lambda email=rng.choice(students)['email']:
+                                   client.post('/api/auth/login', json={'email': email, 'password': PASSWORD}))
+                                  for _ in range(max(1, n // 10)))),
+        ('POST /api/gigs/<id>/approve', (post(f"/api/gigs/{gig['_id']}/approve", employer_tokens[gig['employer_id']], {})
+                                         for gig in approvable[:n])),
+        ('POST /api/gigs/skill-synth/generate-quiz (bank hit)', (post('/api/gigs/skill-synth/generate-quiz', rng.choice(student_tokens),
+                                                                      {'target_skill_gap': rng.choice(SKILLS)}) for _ in range(n))),
+    ]
+    return dict(run_endpoint(name, requests_iter) for name, requests_iter in suite)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline):
+    for endpoint, result in current['results'].items():
+        before = baseline['results'].get(endpoint)
+        if not before:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+        print(f"{endpoint:55s} p50 {before['p50_ms']:>9.3f} -> {result['p50_ms']:>9.3f} ms ({change:+.1f}%)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', help='Local mongod to use instead of mongomock (its database is wiped)')
+    parser.add_argument('--employers', type=int, default=50)
+    parser.add_argument('--gigs-per-employer', type=int, default=200)
+    parser.add_argument('--escrowed-per-employer', type=int, default=20)
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--badges-per-student', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--ai-latency', type=float, default=0.0, help='Seconds the stub OpenRouter waits')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout')
+    parser.add_argument('--compare', help='Previous JSON report to print p50 changes against')
+    args = parser.parse_args()
+
+    app = build_app(args, start_stub_openrouter(args.ai_latency))
+    employers, students, escrowed = seed(app, args)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'backend': 'mongod' if args.mongo_uri else 'mongomock',
+        'dataset': {'employers': args.employers, 'gigs': args.employers * args.gigs_per_employer,
+                    'students': args.students, 'badges_per_student': args.badges_per_student},
+        'results': run_suite(app, args, employers, students, escrowed)
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
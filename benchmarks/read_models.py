@@ -0,0 +1,136 @@
+"""
+Memory and time of the gig read paths on a 100k-gig fixture.
+
+Compares, for the same documents:
+  hydrated      Gig.from_dict(doc) (and .to_dict()) for every gig, the old listing path
+  raw           projected raw documents, as Gig.iter_raw yields them
+  tuples        tuples of the projected fields, as Gig.iter_raw(as_tuples=True) yields them
+
+Then stores them and reads them back through the model read paths: Gig.iter_raw (full documents hydrated
+with Gig.from_dict, projected documents, tuples) and Gig.find_page walked page by page as the listing
+does. The store is the `gigs` collection of the `cashngo_bench` database of --mongo-uri, or, without it,
+an in-process mongomock stand-in (`pip install mongomock`) holding the first --mock-gigs documents, as
+mongomock sorts in Python. Prints one JSON object per path.
+
+    python benchmarks/read_models.py --gigs 100000 --mongo-uri mongodb://127.0.0.1:27017
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId
+from models.gig import Gig
+
+LIST_FIELDS = ('title', 'price', 'status', 'required_skill_tag', 'created_at')
+
+
+def make_fixture(count):
+    now = datetime.datetime.utcnow()
+    employers = [str(ObjectId()) for _ in range(max(1, count // 50))]
+    return [{
+        '_id': ObjectId(),
+        'title': f'Gig {i}',
+        'description': 'Design a logo and a small set of social media banners for a student-run event. ' * 2,
+        'price': float(10 + i % 500),
+        'required_skill_tag': ('Graphic Design', 'Python', 'Copywriting', 'Video Editing')[i % 4],
+        'skill_key': ('graphic design', 'python', 'copywriting', 'video editing')[i % 4],
+        'employer_id': employers[i % len(employers)],
+        'status': ('POSTED', 'ESCROWED', 'PAID')[i % 3],
+        'applied_students': [],
+        'claimed_by': None,
+        'created_at': (now - datetime.timedelta(seconds=i)).isoformat()
+    } for i in range(count)]
+
+
+def measure(name, build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'path': name, 'items': len(result), 'seconds': round(elapsed, 4),
+            'retained_mb': round(current / 2 ** 20, 2), 'peak_mb': round(peak / 2 ** 20, 2)}
+
+
+def in_memory_paths(docs):
+    return [
+        measure('hydrated (objects kept)', lambda: [Gig.from_dict(doc) for doc in docs]),
+        measure('hydrated -> to_dict', lambda: [Gig.from_dict(doc).to_dict() for doc in docs]),
+        measure('raw (projected)', lambda: [{field: doc[field] for field in ('_id',) + LIST_FIELDS} for doc in docs]),
+        measure('tuples (projected)', lambda: [tuple(doc[field] for field in LIST_FIELDS) for doc in docs]),
+    ]
+
+
+def build_app(mongo_uri):
+    os.environ['MONGO_URI'] = mongo_uri or 'mongodb://127.0.0.1:27017/cashngo_bench'
+    os.environ.setdefault('SECRET_KEY', 'bench-secret')
+    os.environ['MONGO_ENSURE_INDEXES'] = 'false'
+    os.environ['WARMUP_ON_START'] = 'false'
+
+    from app import create_app
+    from services import database_service
+    app = create_app()
+    if mongo_uri:
+        database_service.mongo.db = database_service.mongo.cx['cashngo_bench']
+    else:
+        import mongomock
+        database_service.mongo.cx = mongomock.MongoClient()
+        database_service.mongo.db = database_service.mongo.cx['cashngo_bench']
+    return app
+
+
+def walk_pages(page_size):
+    gigs, cursor = [], None
+    while True:
+        page, cursor = Gig.find_page(limit=page_size, cursor=cursor, fields=LIST_FIELDS)
+        gigs.extend(page)
+        if cursor is None:
+            return gigs
+
+
+def store_paths(docs, mongo_uri, page_size):
+    from services.database_service import get_collection
+    from services.index_service import ensure_indexes
+    store = 'mongo' if mongo_uri else 'mongomock'
+    with build_app(mongo_uri).app_context():
+        collection = get_collection(Gig.collection_name)
+        collection.drop()
+        if mongo_uri:
+            ensure_indexes()
+        collection.insert_many(docs, ordered=False)
+        try:
+            return [
+                measure(f'{store} Gig.iter_raw -> from_dict', lambda: [Gig.from_dict(doc).to_dict() for doc in Gig.iter_raw()]),
+                measure(f'{store} Gig.iter_raw (projected)', lambda: list(Gig.iter_raw(fields=LIST_FIELDS, batch_size=1000))),
+                measure(f'{store} Gig.iter_raw (tuples)',
+                        lambda: list(Gig.iter_raw(fields=LIST_FIELDS, batch_size=1000, as_tuples=True))),
+                measure(f'{store} Gig.find_page x {page_size}', lambda: walk_pages(page_size)),
+            ]
+        finally:
+            collection.drop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gigs', type=int, default=100000)
+    parser.add_argument('--mongo-uri', help='MongoDB to store the gigs in, instead of mongomock')
+    parser.add_argument('--mock-gigs', type=int, default=2000, help='Gigs stored in mongomock (without --mongo-uri)')
+    parser.add_argument('--page-size', type=int, default=100, help='find_page limit')
+    args = parser.parse_args()
+
+    docs = make_fixture(args.gigs)
+    results = in_memory_paths(docs)
+    results += store_paths(docs if args.mongo_uri else docs[:args.mock_gigs], args.mongo_uri, args.page_size)
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Compares gunicorn worker models (sync, gthread, gevent) on this app.
+
+For each worker class it starts `gunicorn -c gunicorn.conf.py "app:create_app()"` on a free port (using the
+MONGO_URI etc. from the environment / .env), waits for `/` to answer, then keeps --concurrency requests in flight
+against --path for --duration seconds. Prints one JSON object per worker model with throughput and latency
+percentiles, e.g.
+
+    python benchmarks/worker_models.py --path /api/payments/wallet --token "$TOKEN" --concurrency 200
+
+gevent is skipped when it is not installed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not start within {timeout}s")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(url, headers, concurrency, duration):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        nonlocal errors
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60).read()
+                failed = False
+            except (urllib.error.URLError, OSError):
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def benchmark_worker_class(worker_class, args):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=worker_class, MONGO_ENSURE_INDEXES='false')
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:create_app()'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(base_url)
+        headers = {'x-access-token': args.token} if args.token else {}
+        result = run_load(base_url + args.path, headers, args.concurrency, args.duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return dict(worker_class=worker_class, path=args.path, concurrency=args.concurrency, **result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker-classes', default='sync,gthread,gevent')
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--token', help='x-access-token for authenticated paths')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY for every run (default: gunicorn.conf.py)')
+    args = parser.parse_args()
+
+    for worker_class in args.worker_classes.split(','):
+        if worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print(json.dumps({'worker_class': 'gevent', 'skipped': 'gevent is not installed'}))
+            continue
+        print(json.dumps(benchmark_worker_class(worker_class, args)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
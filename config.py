@@ -1,10 +1,83 @@
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
+# An explicit path skips python-dotenv's search up the directory tree; there is no .env on Heroku at all
+_env_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+if os.path.exists(_env_file):
+    load_dotenv(_env_file)
 
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')
     MONGO_URI = os.getenv('MONGO_URI')
     OPEN_API_KEY = os.getenv('OPEN_API_KEY') 
-    JWT_ACCESS_TOKEN_EXPIRES_SECONDS = 3600
\ No newline at end of file
+    JWT_ACCESS_TOKEN_EXPIRES_SECONDS = 3600
+    # Password hashing (see services/password_service.py): argon2id cost, and hashes run at once per worker process
+    ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+    ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 19456))  # KiB
+    ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    # Request metrics (GET /metrics, Prometheus format), served only with `Authorization: Bearer <METRICS_API_KEY>`; 403 while unset.
+    METRICS_API_KEY = os.getenv('METRICS_API_KEY')
+    METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+    METRICS_MONGO_CALLS_WARN = int(os.getenv('METRICS_MONGO_CALLS_WARN', 10))
+    # MongoClient pool, per worker process. Keep MONGO_MAX_POOL_SIZE >= GUNICORN_THREADS + QUIZ_JOB_WORKERS.
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 64))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000))
+    # Create/verify the models' indexes during warm-up (they can also be created with `flask ensure-indexes`)
+    MONGO_ENSURE_INDEXES = os.getenv('MONGO_ENSURE_INDEXES', 'true').lower() in ('1', 'true', 'yes')
+    # Warm-up (see services/readiness_service.py): started in the background by create_app when WARMUP_ON_START,
+    # otherwise by the first GET /ready. It opens READY_WARM_CONNECTIONS pooled connections.
+    WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'true').lower() in ('1', 'true', 'yes')
+    READY_WARM_CONNECTIONS = int(os.getenv('READY_WARM_CONNECTIONS', 4))
+    # How long GET /ready reuses its last MongoDB health check
+    READY_CACHE_SECONDS = float(os.getenv('READY_CACHE_SECONDS', 5))
+    # Log how long each import and initialization step of create_app took
+    STARTUP_PROFILE = os.getenv('STARTUP_PROFILE', 'false').lower() in ('1', 'true', 'yes')
+    GIGS_PAGE_DEFAULT_LIMIT = int(os.getenv('GIGS_PAGE_DEFAULT_LIMIT', 20))
+    GIGS_PAGE_MAX_LIMIT = int(os.getenv('GIGS_PAGE_MAX_LIMIT', 100))
+    # Most gigs one POST /api/gigs/bulk or /api/gigs/bulk/approve call may carry
+    GIGS_BULK_MAX_ITEMS = int(os.getenv('GIGS_BULK_MAX_ITEMS', 100))
+    # Longest q accepted by GET /api/gigs/search
+    GIGS_SEARCH_MAX_LENGTH = int(os.getenv('GIGS_SEARCH_MAX_LENGTH', 200))
+    # How many of the best-scoring gigs GET /api/gigs/recommended pages through
+    GIGS_RECOMMENDED_TOP_K = int(os.getenv('GIGS_RECOMMENDED_TOP_K', 100))
+    # NDJSON exports (GET /api/gigs/export, /api/gigs/skill-synth/quizzes/export), for the analytics sync
+    EXPORT_API_KEY = os.getenv('EXPORT_API_KEY')
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+    # Authenticated-user cache used by token_required. TTL 0 disables it; set a Redis URL to share it between workers.
+    USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', 30))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 1024))
+    USER_CACHE_REDIS_URL = os.getenv('USER_CACHE_REDIS_URL')
+    # Employer dashboard summaries (GET /api/gigs/dashboard), dropped whenever one of the employer's gigs changes.
+    # Without a Redis URL other workers may serve a summary up to the TTL old.
+    DASHBOARD_CACHE_TTL_SECONDS = int(os.getenv('DASHBOARD_CACHE_TTL_SECONDS', 30))
+    DASHBOARD_CACHE_MAX_ENTRIES = int(os.getenv('DASHBOARD_CACHE_MAX_ENTRIES', 1024))
+    DASHBOARD_CACHE_REDIS_URL = os.getenv('DASHBOARD_CACHE_REDIS_URL')
+    # Background quiz generation (see services/quiz_job_service.py), per worker process
+    QUIZ_JOB_WORKERS = int(os.getenv('QUIZ_JOB_WORKERS', 4))
+    QUIZ_JOB_MAX_PENDING = int(os.getenv('QUIZ_JOB_MAX_PENDING', 32))
+    # A PENDING/RUNNING job unchanged for this long is reported FAILED: its worker was recycled or crashed.
+    # Keep it above the slowest generation, AI_MAX_ATTEMPTS x (AI_HTTP_MAX_RETRIES + 1) x the HTTP timeouts, plus queueing.
+    QUIZ_JOB_TIMEOUT_SECONDS = int(os.getenv('QUIZ_JOB_TIMEOUT_SECONDS', 600))
+    # Quiz jobs are deleted by a TTL index this long after creation
+    QUIZ_JOB_RETENTION_SECONDS = int(os.getenv('QUIZ_JOB_RETENTION_SECONDS', 24 * 3600))
+    # Generated quizzes (and their answer keys) are deleted by a TTL index this long after creation
+    QUIZ_RETENTION_SECONDS = int(os.getenv('QUIZ_RETENTION_SECONDS', 7 * 24 * 3600))
+    # AI provider HTTP client (see services/ai_service.py). AI_BASE_URL can point at a local stub server in tests.
+    AI_BASE_URL = os.getenv('AI_BASE_URL', 'https://openrouter.ai/api/v1')
+    AI_HTTP_POOL_SIZE = int(os.getenv('AI_HTTP_POOL_SIZE', 10))
+    AI_HTTP_CONNECT_TIMEOUT = float(os.getenv('AI_HTTP_CONNECT_TIMEOUT', 5))
+    AI_HTTP_READ_TIMEOUT = float(os.getenv('AI_HTTP_READ_TIMEOUT', 25))
+    AI_HTTP_MAX_RETRIES = int(os.getenv('AI_HTTP_MAX_RETRIES', 2))
+    AI_HTTP_RETRY_BACKOFF = float(os.getenv('AI_HTTP_RETRY_BACKOFF', 0.5))
+    AI_MAX_ATTEMPTS = int(os.getenv('AI_MAX_ATTEMPTS', 2))
+    # Provider call budget per worker process (token bucket). Generations beyond it get a 429. 0 disables it.
+    AI_CALLS_PER_MINUTE = float(os.getenv('AI_CALLS_PER_MINUTE', 30))
+    AI_CALL_BURST = int(os.getenv('AI_CALL_BURST', 10))
+    # Quiz bank: generated quizzes reused per (primary_skill, target_skill_gap). QUIZ_BANK_VARIANTS 0 disables it.
+    QUIZ_BANK_VARIANTS = int(os.getenv('QUIZ_BANK_VARIANTS', 5))
+    QUIZ_BANK_LOW_WATER = int(os.getenv('QUIZ_BANK_LOW_WATER', 2))
+    QUIZ_BANK_TTL_SECONDS = int(os.getenv('QUIZ_BANK_TTL_SECONDS', 7 * 24 * 3600))
+    QUIZ_BANK_MAX_KEYS = int(os.getenv('QUIZ_BANK_MAX_KEYS', 500))
@@ -1 +1,33 @@
-timeout = 120
\ No newline at end of file
+import multiprocessing
+import os
+
+# Serving model, sized from the environment.
+#
+# gthread (default): each worker process serves GUNICORN_THREADS requests at once, so a request blocked on
+# MongoDB only holds a thread, not a whole worker. PyMongo's MongoClient and the pooled requests.Session used
+# for the AI provider are both thread safe; keep MONGO_MAX_POOL_SIZE >= GUNICORN_THREADS + QUIZ_JOB_WORKERS.
+#
+# gevent: set GUNICORN_WORKER_CLASS=gevent (needs `pip install gevent`). gunicorn monkey-patches the stdlib,
+# which PyMongo and requests both support, and each worker holds up to GUNICORN_WORKER_CONNECTIONS connections.
+# Patched threads are greenlets, so CPU-bound work must not run on them: password hashing moves to gevent's
+# native threadpool (services/password_service.py), and a worker still only hashes PASSWORD_HASH_WORKERS
+# passwords at a time, like one gthread worker.
+#
+# Compare the two on your dyno with benchmarks/worker_models.py.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# Heroku sets WEB_CONCURRENCY from the dyno size
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
@@ -1,21 +1,80 @@
-from services.database_service import get_collection
+from services.database_service import get_collection, changed_fields, persisted_snapshot, bump_collection_version
+from services.cache_service import dashboard_cache
+from models.skill import normalize_skill_tag, skill_tokens, SkillIndex
+from models.persistence import PersistedModel
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import datetime
+import base64
+import json
 
-class Gig:
+class InvalidCursorError(ValueError):
+    pass
+
+class Gig(PersistedModel):
+    __slots__ = ('title', 'description', 'price', 'required_skill_tag', 'skill_key', 'employer_id', 'status',
+                 'applied_students', 'claimed_by', 'created_at', 'version', '_id', '_persisted')
     collection_name = 'gigs'
 
-    def __init__(self, title, description, price, required_skill_tag, employer_id, status="POSTED", applied_students=None, claimed_by=None, _id=None):
+    # Fields that are always returned by find_page, whatever projection was asked for
+    # (the cursor for the next page is built from them).
+    cursor_fields = ('_id', 'created_at')
+    # Stored for server-side lookups only, never part of the public gig representation
+    internal_fields = ('skill_key',)
+    # Weight of a term in the recommendation index, by the field it comes from: skill tag, then title, then description
+    recommendation_field_weights = (('required_skill_tag', 5), ('title', 3), ('description', 1))
+    # Weight of a student's terms when matched against it: earned badges count double the stated primary skill
+    recommendation_profile_weights = {'badges': 2, 'primary_skill': 1}
+    # Most terms a gig is indexed under, so long descriptions do not bloat the index
+    recommendation_max_terms = 48
+    # Statuses whose price is still held against the employer's wallet
+    # SETTLING only exists while a payment is being settled without transactions (see services/payment_service.py)
+    committed_statuses = ('POSTED', 'ESCROWED', 'SETTLING')
+    # Listing order, the employer's dashboard and committed totals, skill unlocks, recommendations and search
+    indexes = [
+        {'keys': [('employer_id', 1), ('status', 1)]},
+        {'keys': [('status', 1), ('created_at', -1)]},
+        {'keys': [('created_at', -1), ('_id', -1)]},
+        {'keys': [('skill_key', 1)]},
+        # Recommendation index: token -> POSTED gigs (see recommendation_terms)
+        {'keys': [('rec_terms.t', 1)]},
+        # Full-text search (search_page). A collection can only have one text index.
+        {'keys': [('title', 'text'), ('description', 'text'), ('required_skill_tag', 'text')],
+         'weights': {'title': 10, 'required_skill_tag': 5, 'description': 1}, 'name': 'gig_text_search'},
+    ]
+    # The listing with and without a status filter, the employer's totals, badge registration, search and recommendations
+    query_shapes = {
+        'committed_total': ['employer_id', 'status'],
+        'employer_summary': ['employer_id'],
+        'find_page': ['created_at', '_id'],
+        'find_page(status)': ['status', 'created_at'],
+        'SkillIndex.register_badge': ['skill_key'],
+        # Text indexes show up as the _fts field
+        'search_page': ['_fts'],
+        'recommend_page': ['rec_terms.t'],
+    }
+    # Compared by save(). skill_key and rec_terms derive from the others, so editing a gig rewrites its index entries
+    stored_fields = ('title', 'description', 'price', 'required_skill_tag', 'employer_id', 'status', 'applied_students',
+                     'claimed_by', 'created_at', 'skill_key', 'rec_terms')
+    listable_fields = ('title', 'description', 'price', 'required_skill_tag', 'employer_id', 'status', 'applied_students', 'claimed_by', 'created_at')
+
+    def __init__(self, title, description, price, required_skill_tag, employer_id, status="POSTED", applied_students=None, claimed_by=None, created_at=None, version=0, _id=None):
         self.title = title
         self.description = description
         self.price = float(price)
         self.required_skill_tag = required_skill_tag
+        self.skill_key = normalize_skill_tag(required_skill_tag)
         self.employer_id = str(employer_id)
         self.status = status
         self.applied_students = applied_students if applied_students is not None else [] 
         self.claimed_by = claimed_by
-        self.created_at = datetime.datetime.utcnow()
+        self.created_at = created_at if created_at else datetime.datetime.utcnow()
+        # Incremented by every write to the gig, used for ETags (0 for gigs stored before it was tracked)
+        self.version = version
         self._id = _id if _id else ObjectId()
+        # Snapshot of the document as last loaded or saved (see persisted_snapshot), None until the gig is in the database (see save)
+        self._persisted = None
 
     def to_dict(self):
         return {
@@ -33,7 +92,7 @@ class Gig:
 
     @staticmethod
     def from_dict(data):
-        return Gig(
+        gig = Gig(
             title=data.get('title'),
             description=data.get('description'),
             price=data.get('price'),
@@ -42,21 +101,138 @@ class Gig:
             status=data.get('status', "POSTED"),
             applied_students=data.get('applied_students'),
             claimed_by=data.get('claimed_by'),
+            created_at=Gig._parse_created_at(data.get('created_at')),
+            version=data.get('version', 0),
             _id=data.get('_id')
         )
+        gig._persisted = persisted_snapshot(data, Gig.stored_fields)
+        return gig
+
+    @staticmethod
+    def _parse_created_at(value):
+        if isinstance(value, str):
+            return datetime.datetime.fromisoformat(value)
+        return value
+
+    def recommendation_terms(self):
+        """
+        The gig's entries in the recommendation index, [{'t': token, 'w': weight}], summing the field weights of
+        every field a token appears in. Only POSTED gigs are indexed: any other status stores [], so the multikey
+        index on rec_terms.t only ever points at gigs a student can still apply for.
+        """
+        if self.status != 'POSTED':
+            return []
+        weights = {}
+        for field, weight in Gig.recommendation_field_weights:
+            for token in skill_tokens(getattr(self, field)):
+                weights[token] = weights.get(token, 0) + weight
+        terms = sorted(weights.items(), key=lambda term: (-term[1], term[0]))[:Gig.recommendation_max_terms]
+        return [{'t': token, 'w': weight} for token, weight in sorted(terms)]
+
+    @staticmethod
+    def profile_terms(primary_skill, badges):
+        """A student's side of the recommendation index: {token: weight} from their primary skill and badges."""
+        weights = {}
+        for token in skill_tokens(primary_skill):
+            weights[token] = weights.get(token, 0) + Gig.recommendation_profile_weights['primary_skill']
+        for token in set().union(*(skill_tokens(badge) for badge in badges or [])):
+            weights[token] = weights.get(token, 0) + Gig.recommendation_profile_weights['badges']
+        return weights
+
+    def _document(self):
+        """The gig as stored: to_dict plus the ObjectId, skill_key and recommendation index terms."""
+        gig_data = self.to_dict()
+        gig_data['_id'] = ObjectId(gig_data['_id'])
+        gig_data['skill_key'] = self.skill_key = normalize_skill_tag(self.required_skill_tag)
+        gig_data['rec_terms'] = self.recommendation_terms()
+        return gig_data
 
     def save(self):
+        """
+        Inserts a new gig, or $sets only the fields changed since it was loaded, bumping its version.
+        One round trip either way, plus the gigs collection version bump when something was written.
+        The gig's recommendation index terms change with it, so posting, editing or claiming a gig keeps the index current.
+        """
         gigs_collection = get_collection(self.collection_name)
-        gig_data = self.to_dict()
-        if '_id' in gig_data:
-            gig_data['_id'] = ObjectId(gig_data['_id'])
-        
-        if gigs_collection.find_one({'_id': self._id}):
-            gigs_collection.update_one({'_id': self._id}, {'$set': gig_data})
-        else:
+        gig_data = self._document()
+
+        if self._persisted is None:
+            gig_data['version'] = self.version = 1
             gigs_collection.insert_one(gig_data)
+            changes = gig_data
+            new_skill_key = True
+        else:
+            changes = changed_fields(self._persisted, self.stored_fields, gig_data)
+            if changes:
+                gigs_collection.update_one({'_id': gig_data['_id']}, {'$set': changes, '$inc': {'version': 1}})
+                self.version += 1
+            new_skill_key = 'skill_key' in changes
+        self._persisted = persisted_snapshot(gig_data, self.stored_fields)
+        if changes:
+            bump_collection_version(self.collection_name)
+            dashboard_cache.invalidate(self.employer_id)
+        if new_skill_key:
+            SkillIndex.register_tag(self.skill_key)
         return self
 
+    @staticmethod
+    def insert_many(gigs):
+        """
+        Inserts new gigs in one unordered round trip. Returns the positions (in `gigs`) of the gigs that
+        could not be inserted; the others are saved as if by save().
+        """
+        gigs_collection = get_collection(Gig.collection_name)
+        documents = []
+        for gig in gigs:
+            gig_data = gig._document()
+            gig_data['version'] = 1
+            documents.append(gig_data)
+
+        failed = set()
+        try:
+            gigs_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+
+        for position, (gig, gig_data) in enumerate(zip(gigs, documents)):
+            if position not in failed:
+                gig.version = 1
+                gig._persisted = persisted_snapshot(gig_data, Gig.stored_fields)
+        if len(failed) < len(gigs):
+            bump_collection_version(Gig.collection_name)
+            for employer_id in {gig.employer_id for gig in gigs}:
+                dashboard_cache.invalidate(employer_id)
+            for skill_key in {gig.skill_key for position, gig in enumerate(gigs) if position not in failed}:
+                SkillIndex.register_tag(skill_key)
+        return failed
+
+    @staticmethod
+    def rebuild_recommendation_terms(batch_size=500):
+        """
+        Recomputes rec_terms on every gig, for gigs stored before the recommendation index existed or after
+        its weights change. Returns the number of gigs whose terms changed.
+        """
+        gigs_collection = get_collection(Gig.collection_name)
+        updated = 0
+        batch = []
+        for gig_data in gigs_collection.find({}).batch_size(batch_size):
+            terms = Gig.from_dict(gig_data).recommendation_terms()
+            if gig_data.get('rec_terms') != terms:
+                batch.append(UpdateOne({'_id': gig_data['_id']}, {'$set': {'rec_terms': terms}}))
+            if len(batch) >= batch_size:
+                updated += gigs_collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += gigs_collection.bulk_write(batch, ordered=False).modified_count
+        if updated:
+            # Recommendation listings may have changed
+            bump_collection_version(Gig.collection_name)
+        return updated
+
+    def is_unlocked_for(self, unlocked_skill_keys):
+        """unlocked_skill_keys is None for users that can see every gig (non-students)."""
+        return unlocked_skill_keys is None or self.skill_key in unlocked_skill_keys
+
     @staticmethod
     def find_by_id(gig_id):
         gigs_collection = get_collection(Gig.collection_name)
@@ -64,11 +240,244 @@ class Gig:
         return Gig.from_dict(gig_data) if gig_data else None
 
     @staticmethod
-    def find_all():
+    def find_by_ids(gig_ids):
+        """The gigs with these ids, in one query, as {gig _id string: Gig}. Missing gigs are left out."""
         gigs_collection = get_collection(Gig.collection_name)
-        return [Gig.from_dict(gig) for gig in gigs_collection.find()]
+        gigs = gigs_collection.find({'_id': {'$in': [ObjectId(gig_id) for gig_id in gig_ids]}})
+        return {str(gig['_id']): Gig.from_dict(gig) for gig in gigs}
+
+    @staticmethod
+    def find_version(gig_id):
+        """The gig's version without loading the gig (None if it does not exist), for conditional GETs."""
+        gigs_collection = get_collection(Gig.collection_name)
+        gig_data = gigs_collection.find_one({'_id': ObjectId(gig_id)}, {'version': 1})
+        return gig_data.get('version', 0) if gig_data else None
+
+    @staticmethod
+    def iter_raw(query=None, fields=None, sort=None, limit=0, batch_size=None, as_tuples=False):
+        """
+        Read-only path for listings: yields projected raw documents straight from the cursor, without building
+        Gig objects. With as_tuples=True (fields required) yields tuples in `fields` order instead, the
+        cheapest shape to hold many of. Documents are not copied, so callers must not save them back.
+        """
+        if as_tuples and not fields:
+            raise ValueError("as_tuples needs an explicit list of fields.")
+        gigs_collection = get_collection(Gig.collection_name)
+        cursor = gigs_collection.find(query or {}, Gig.projection(fields), limit=limit, sort=sort)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        if not as_tuples:
+            yield from cursor
+            return
+        for gig in cursor:
+            yield tuple(gig.get(field) for field in fields)
+
+    @staticmethod
+    def projection(fields):
+        """Mongo projection for `fields`; None (every field) when no fields are given."""
+        return {field: 1 for field in fields} if fields else None
 
     @staticmethod
-    def find_by_employer(employer_id):
+    def committed_total(employer_id):
+        """Sum of POSTED/ESCROWED gig prices for an employer, as a single $group on (employer_id, status)."""
         gigs_collection = get_collection(Gig.collection_name)
-        return [Gig.from_dict(gig) for gig in gigs_collection.find({'employer_id': str(employer_id)})]
\ No newline at end of file
+        result = list(gigs_collection.aggregate([
+            {'$match': {'employer_id': str(employer_id), 'status': {'$in': list(Gig.committed_statuses)}}},
+            {'$group': {'_id': None, 'total': {'$sum': '$price'}}}
+        ]))
+        return float(result[0]['total']) if result else 0.0
+
+    @staticmethod
+    def employer_summary(employer_id):
+        """
+        Dashboard numbers for an employer from one $group over gigs(employer_id, status), cached in dashboard_cache
+        until one of the employer's gigs changes: gig count, price total and applicant count per status.
+        """
+        summary = dashboard_cache.get(employer_id)
+        if summary is not None:
+            return summary
+        gigs_collection = get_collection(Gig.collection_name)
+        by_status = gigs_collection.aggregate([
+            {'$match': {'employer_id': str(employer_id)}},
+            {'$group': {
+                '_id': '$status',
+                'count': {'$sum': 1},
+                'total_price': {'$sum': '$price'},
+                'applicants': {'$sum': {'$size': {'$ifNull': ['$applied_students', []]}}}
+            }}
+        ])
+        summary = {
+            'statuses': {str(status['_id']): {'count': status['count'], 'total_price': float(status['total_price']), 'applicants': status['applicants']}
+                         for status in by_status},
+            'generated_at': datetime.datetime.utcnow().isoformat()
+        }
+        dashboard_cache.set(employer_id, summary)
+        return summary
+
+    @staticmethod
+    def build_filter(status=None, skill_tag=None, employer_id=None, min_price=None, max_price=None, unlocked_skill_keys=None):
+        """
+        Builds a Mongo filter from the optional listing filters.
+        Pass unlocked_skill_keys (see SkillIndex.unlocked_tags) to only match gigs the user has unlocked.
+        """
+        query = {}
+        if status:
+            statuses = status if isinstance(status, (list, tuple)) else [status]
+            query['status'] = statuses[0] if len(statuses) == 1 else {'$in': list(statuses)}
+        if skill_tag:
+            query['skill_key'] = normalize_skill_tag(skill_tag)
+        if unlocked_skill_keys is not None:
+            if skill_tag:
+                query['skill_key'] = query['skill_key'] if query['skill_key'] in unlocked_skill_keys else {'$in': []}
+            else:
+                query['skill_key'] = {'$in': list(unlocked_skill_keys)}
+        if employer_id:
+            query['employer_id'] = str(employer_id)
+        price_range = {}
+        if min_price is not None:
+            price_range['$gte'] = float(min_price)
+        if max_price is not None:
+            price_range['$lte'] = float(max_price)
+        if price_range:
+            query['price'] = price_range
+        return query
+
+    @staticmethod
+    def _encode_keyset(sort_value, gig_id):
+        raw = json.dumps([sort_value, str(gig_id)])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def _decode_keyset(cursor, sort_type):
+        try:
+            sort_value, gig_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if not isinstance(sort_value, sort_type) or isinstance(sort_value, bool):
+                raise ValueError(sort_value)
+            return sort_value, ObjectId(gig_id)
+        except Exception:
+            raise InvalidCursorError("Invalid cursor.")
+
+    @staticmethod
+    def encode_cursor(gig_data):
+        return Gig._encode_keyset(gig_data['created_at'], gig_data['_id'])
+
+    @staticmethod
+    def decode_cursor(cursor):
+        return Gig._decode_keyset(cursor, str)
+
+    @staticmethod
+    def find_page(query=None, limit=20, cursor=None, fields=None):
+        """
+        Keyset pagination over gigs, newest first, ordered by (created_at, _id).
+        Returns (raw gig documents, next_cursor). next_cursor is None on the last page.
+        `fields` restricts the returned fields; `_id`, `created_at` and `skill_key` are always included.
+        """
+        gigs_collection = get_collection(Gig.collection_name)
+        query = dict(query or {})
+        if cursor:
+            created_at, gig_id = Gig.decode_cursor(cursor)
+            query = {'$and': [query, {'$or': [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': gig_id}}
+            ]}]}
+
+        projection = Gig.projection(fields)
+        if projection:
+            for field in Gig.cursor_fields + Gig.internal_fields:
+                projection[field] = 1
+
+        gigs = list(
+            gigs_collection.find(query, projection)
+            .sort([('created_at', -1), ('_id', -1)])
+            .limit(limit + 1)
+        )
+        next_cursor = None
+        if len(gigs) > limit:
+            gigs = gigs[:limit]
+            next_cursor = Gig.encode_cursor(gigs[-1])
+        return gigs, next_cursor
+
+    @staticmethod
+    def search_page(text, query=None, limit=20, cursor=None, fields=None):
+        """
+        Full-text search over title, required_skill_tag and description (weighted in that order) through the
+        text index, best matches first, ordered by (score, _id). `query` adds filters (see build_filter).
+        Returns (raw gig documents with their `score`, next_cursor), like find_page.
+        """
+        gigs_collection = get_collection(Gig.collection_name)
+        pipeline = [
+            {'$match': {'$text': {'$search': text}, **(query or {})}},
+            {'$addFields': {'score': {'$meta': 'textScore'}}},
+        ]
+        if cursor:
+            score, gig_id = Gig._decode_keyset(cursor, (int, float))
+            pipeline.append({'$match': {'$or': [
+                {'score': {'$lt': score}},
+                {'score': score, '_id': {'$lt': gig_id}}
+            ]}})
+        pipeline += [
+            {'$sort': {'score': -1, '_id': -1}},
+            {'$limit': limit + 1},
+        ]
+        projection = Gig.projection(fields)
+        if projection:
+            for field in ('score',) + Gig.internal_fields:
+                projection[field] = 1
+            pipeline.append({'$project': projection})
+
+        gigs = list(gigs_collection.aggregate(pipeline))
+        next_cursor = None
+        if len(gigs) > limit:
+            gigs = gigs[:limit]
+            next_cursor = Gig._encode_keyset(gigs[-1]['score'], gigs[-1]['_id'])
+        return gigs, next_cursor
+
+    @staticmethod
+    def recommend_page(profile_terms, query=None, top_k=100, limit=20, cursor=None, fields=None):
+        """
+        POSTED gigs ranked for a student, best first, ordered by (score, _id). Candidates come from the
+        rec_terms.t index (gigs sharing at least one token with profile_terms, see profile_terms), never a
+        collection scan; a gig's score is the sum over shared tokens of its term weight times the student's.
+        Only the top_k best candidates are paged through. `query` adds filters (see build_filter).
+        Returns (raw gig documents with their `score`, next_cursor), like search_page.
+        """
+        if not profile_terms:
+            return [], None
+        gigs_collection = get_collection(Gig.collection_name)
+        # One $filter per distinct student weight (at most a handful) instead of a lookup per token. The matched
+        # terms go to temporary fields first so the score sums field paths (which mongomock supports too).
+        tokens_by_weight = {}
+        for token, weight in profile_terms.items():
+            tokens_by_weight.setdefault(weight, []).append(token)
+        matched = {f'_rec_{i}': (weight, {'$filter': {'input': '$rec_terms', 'as': 'term', 'cond': {'$in': ['$$term.t', tokens]}}})
+                   for i, (weight, tokens) in enumerate(tokens_by_weight.items())}
+        score = {'$add': [{'$multiply': [weight, {'$sum': f'${field}.w'}]} for field, (weight, _) in matched.items()]}
+        pipeline = [
+            {'$match': {**(query or {}), 'status': 'POSTED', 'rec_terms.t': {'$in': list(profile_terms)}}},
+            {'$addFields': {field: terms for field, (_, terms) in matched.items()}},
+            {'$addFields': {'score': score}},
+            # $sort followed by $limit only keeps top_k documents in memory
+            {'$sort': {'score': -1, '_id': -1}},
+            {'$limit': top_k},
+        ]
+        if cursor:
+            last_score, gig_id = Gig._decode_keyset(cursor, (int, float))
+            pipeline.append({'$match': {'$or': [
+                {'score': {'$lt': last_score}},
+                {'score': last_score, '_id': {'$lt': gig_id}}
+            ]}})
+        pipeline.append({'$limit': limit + 1})
+        projection = Gig.projection(fields)
+        if projection:
+            for field in ('score',) + Gig.internal_fields:
+                projection[field] = 1
+            pipeline.append({'$project': projection})
+        else:
+            pipeline.append({'$project': {'rec_terms': 0, **{field: 0 for field in matched}}})
+
+        gigs = list(gigs_collection.aggregate(pipeline))
+        next_cursor = None
+        if len(gigs) > limit:
+            gigs = gigs[:limit]
+            next_cursor = Gig._encode_keyset(gigs[-1]['score'], gigs[-1]['_id'])
+        return gigs, next_cursor
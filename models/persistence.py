@@ -0,0 +1,13 @@
+from services.database_service import mark_persisted
+
+
+class PersistedModel:
+    """
+    Shared by the models whose save() only $sets the fields that changed: `_persisted` is the persisted_snapshot
+    of the model's `stored_fields` as last loaded or written, None until the document is in the database.
+    """
+    __slots__ = ()
+
+    def _mark_persisted(self, **fields):
+        """Records fields written by a targeted update so the next save() does not send them again."""
+        self._persisted = mark_persisted(self._persisted, self.stored_fields, fields)
@@ -1,16 +1,38 @@
-from services.database_service import get_collection
+from services.database_service import get_collection, changed_fields, persisted_snapshot
+from models.persistence import PersistedModel
 from bson.objectid import ObjectId
 import datetime
 
-class Quiz:
+class Quiz(PersistedModel):
+    """
+    A quiz generated for one student. created_at is stored as a BSON date so the TTL index can expire quizzes
+    QUIZ_RETENTION_SECONDS after creation, whether or not they were ever submitted.
+    """
+    __slots__ = ('skill_name', 'questions', 'student_id', 'created_at', '_id', '_persisted')
     collection_name = 'quizzes'
 
-    def __init__(self, skill_name, questions, student_id, _id=None):
+    # A student's quizzes, and the TTL index deleting quizzes QUIZ_RETENTION_SECONDS after they were generated
+    indexes = [
+        {'keys': [('student_id', 1)]},
+        {'keys': [('created_at', 1)], 'expire_after_config': 'QUIZ_RETENTION_SECONDS'},
+    ]
+    # Stored as ISO strings before the TTL index existed (see index_service.backfill_dates)
+    date_fields = ('created_at',)
+    # Compared by save(), although a quiz is written once, when generated, and only graded afterwards
+    stored_fields = ('skill_name', 'questions', 'student_id', 'created_at')
+    # Grading loads quizzes by _id; only the per-student lookup needs an index
+    query_shapes = {
+        'by student': ['student_id'],
+    }
+
+    def __init__(self, skill_name, questions, student_id, created_at=None, _id=None):
         self.skill_name = skill_name
         self.questions = questions  # List of dicts: [{'text': str, 'options': list, 'correct_answer_index': int}, ...]
         self.student_id = str(student_id)  # Student who generated the quiz
-        self.created_at = datetime.datetime.utcnow()
+        self.created_at = created_at if created_at else datetime.datetime.utcnow()
         self._id = _id if _id else ObjectId()
+        # Snapshot of the document as last loaded or saved (see persisted_snapshot), None until the quiz is in the database (see save)
+        self._persisted = None
 
     def to_dict(self):
         return {
@@ -23,25 +45,70 @@ class Quiz:
 
     @staticmethod
     def from_dict(data):
-        return Quiz(
+        created_at = data.get('created_at')
+        quiz = Quiz(
             skill_name=data.get('skill_name'),
             questions=data.get('questions'),
             student_id=data.get('student_id'),
+            created_at=datetime.datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at,
             _id=data.get('_id')
         )
+        quiz._persisted = persisted_snapshot(data, Quiz.stored_fields)
+        return quiz
 
     def save(self):
+        """Inserts a new quiz, or $sets only the fields changed since it was loaded. One round trip either way."""
         quizzes_collection = get_collection(self.collection_name)
         quiz_data = self.to_dict()
-        if '_id' in quiz_data:
-            quiz_data['_id'] = ObjectId(quiz_data['_id'])
-        
-        if quizzes_collection.find_one({'_id': self._id}):
-            quizzes_collection.update_one({'_id': self._id}, {'$set': quiz_data})
-        else:
+        quiz_data['_id'] = ObjectId(quiz_data['_id'])
+        quiz_data['created_at'] = self.created_at
+
+        if self._persisted is None:
             quizzes_collection.insert_one(quiz_data)
+        else:
+            changes = changed_fields(self._persisted, self.stored_fields, quiz_data)
+            if changes:
+                quizzes_collection.update_one({'_id': quiz_data['_id']}, {'$set': changes})
+        self._persisted = persisted_snapshot(quiz_data, self.stored_fields)
         return self
 
+    @staticmethod
+    def iter_raw(query=None, sort=None, batch_size=None):
+        """Read-only path: yields raw quiz documents straight from the cursor, without building Quiz objects."""
+        quizzes_collection = get_collection(Quiz.collection_name)
+        cursor = quizzes_collection.find(query or {}, sort=sort)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        yield from cursor
+
+    @staticmethod
+    def find_answer_key(quiz_id):
+        """
+        What grading needs and nothing else: {'student_id', 'skill_name', 'answers'}, without the question
+        text and options. None if the quiz does not exist (or has expired).
+        """
+        quizzes_collection = get_collection(Quiz.collection_name)
+        quiz_data = quizzes_collection.find_one(
+            {'_id': ObjectId(quiz_id)},
+            {'_id': 0, 'student_id': 1, 'skill_name': 1, 'questions.correct_answer_index': 1}
+        )
+        if not quiz_data:
+            return None
+        return {
+            'student_id': quiz_data.get('student_id'),
+            'skill_name': quiz_data.get('skill_name'),
+            'answers': [question.get('correct_answer_index') for question in quiz_data.get('questions', [])]
+        }
+
+    @staticmethod
+    def record_attempt(quiz_id, passed, session=None):
+        """Counts a graded submission; a pass also stamps passed_at."""
+        quizzes_collection = get_collection(Quiz.collection_name)
+        update = {'$inc': {'attempts': 1}}
+        if passed:
+            update['$set'] = {'passed_at': datetime.datetime.utcnow()}
+        quizzes_collection.update_one({'_id': ObjectId(quiz_id)}, update, session=session)
+
     @staticmethod
     def find_by_id(quiz_id):
         quizzes_collection = get_collection(Quiz.collection_name)
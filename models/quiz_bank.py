@@ -0,0 +1,85 @@
+from services.database_service import get_collection
+from models.skill import normalize_skill_tag
+import datetime
+
+class QuizBank:
+    """
+    Generated quizzes kept for reuse, a pool of variants per normalized (primary_skill, target_skill_gap).
+    One document per variant: {bank_key, skill_name, questions, created_at, last_served_at, served_count}.
+    Variants expire after a TTL, and whole pairs are evicted least recently served first.
+    Serving a variant still creates a per-student Quiz (see services/quiz_job_service.py).
+    """
+    collection_name = 'quiz_bank'
+
+    # Newest variants of a pair first for take(), and oldest variants across pairs first for evict()
+    indexes = [
+        {'keys': [('bank_key', 1), ('created_at', -1)]},
+        {'keys': [('created_at', 1)]},
+    ]
+    query_shapes = {
+        'take': ['bank_key', 'created_at'],
+        'evict': ['created_at'],
+    }
+
+    @staticmethod
+    def bank_key(primary_skill, target_skill_gap):
+        return f"{normalize_skill_tag(primary_skill)}|{normalize_skill_tag(target_skill_gap)}"
+
+    @staticmethod
+    def _fresh_since(ttl_seconds):
+        return datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl_seconds)
+
+    @staticmethod
+    def add_variant(bank_key, quiz_data):
+        bank_collection = get_collection(QuizBank.collection_name)
+        now = datetime.datetime.utcnow()
+        bank_collection.insert_one({
+            'bank_key': bank_key,
+            'skill_name': quiz_data['skill_name'],
+            'questions': quiz_data['questions'],
+            'created_at': now,
+            'last_served_at': now,
+            'served_count': 0
+        })
+
+    @staticmethod
+    def take(bank_key, ttl_seconds):
+        """
+        Picks a random fresh variant for the pair in one query.
+        Returns (variant or None, number of fresh variants in the pool).
+        """
+        bank_collection = get_collection(QuizBank.collection_name)
+        result = list(bank_collection.aggregate([
+            {'$match': {'bank_key': bank_key, 'created_at': {'$gte': QuizBank._fresh_since(ttl_seconds)}}},
+            {'$facet': {
+                'variant': [{'$sample': {'size': 1}}],
+                'count': [{'$count': 'fresh'}]
+            }}
+        ]))
+        if not result or not result[0]['variant']:
+            return None, 0
+        variant = result[0]['variant'][0]
+        bank_collection.update_one(
+            {'_id': variant['_id']},
+            {'$set': {'last_served_at': datetime.datetime.utcnow()}, '$inc': {'served_count': 1}}
+        )
+        return variant, result[0]['count'][0]['fresh']
+
+    @staticmethod
+    def fresh_count(bank_key, ttl_seconds):
+        bank_collection = get_collection(QuizBank.collection_name)
+        return bank_collection.count_documents({'bank_key': bank_key, 'created_at': {'$gte': QuizBank._fresh_since(ttl_seconds)}})
+
+    @staticmethod
+    def evict(ttl_seconds, max_keys):
+        """Drops expired variants, then the least recently served pairs beyond max_keys."""
+        bank_collection = get_collection(QuizBank.collection_name)
+        bank_collection.delete_many({'created_at': {'$lt': QuizBank._fresh_since(ttl_seconds)}})
+        pairs = list(bank_collection.aggregate([
+            {'$group': {'_id': '$bank_key', 'last_served_at': {'$max': '$last_served_at'}}},
+            {'$sort': {'last_served_at': -1}},
+            {'$skip': max_keys},
+            {'$project': {'_id': 1}}
+        ]))
+        if pairs:
+            bank_collection.delete_many({'bank_key': {'$in': [pair['_id'] for pair in pairs]}})
@@ -0,0 +1,133 @@
+from services.database_service import get_collection
+from bson.objectid import ObjectId
+import datetime
+
+class QuizJob:
+    """
+    A background quiz generation request (see services/quiz_job_service.py).
+    Status goes PENDING -> RUNNING -> DONE (quiz_id set) or FAILED (error set).
+    Jobs live in Mongo so any worker can answer a status poll. They only run in the memory of the worker that
+    queued them, so a job left PENDING/RUNNING by a recycled or crashed worker is reported FAILED once it is
+    older than QUIZ_JOB_TIMEOUT_SECONDS (see expire_if_stale). created_at and updated_at are BSON dates, so the
+    TTL index and the staleness check compare the same type.
+    """
+    __slots__ = ('student_id', 'primary_skill', 'target_skill_gap', 'status', 'quiz_id', 'error', 'created_at', 'updated_at', '_id')
+    collection_name = 'quiz_jobs'
+
+    # Only the TTL index: finished and abandoned jobs are deleted QUIZ_JOB_RETENTION_SECONDS after they were queued
+    indexes = [
+        {'keys': [('created_at', 1)], 'expire_after_config': 'QUIZ_JOB_RETENTION_SECONDS'},
+    ]
+    # Stored as ISO strings before the TTL index existed (see index_service.backfill_dates)
+    date_fields = ('created_at', 'updated_at')
+    # Jobs are only looked up by _id
+    query_shapes = {}
+    # Error reported for jobs whose worker went away before finishing them
+    STALE_ERROR = 'Quiz generation did not finish. Please try again.'
+
+    def __init__(self, student_id, primary_skill, target_skill_gap, status="PENDING", quiz_id=None, error=None, created_at=None, updated_at=None, _id=None):
+        self.student_id = str(student_id)
+        self.primary_skill = primary_skill
+        self.target_skill_gap = target_skill_gap
+        self.status = status
+        self.quiz_id = quiz_id
+        self.error = error
+        self.created_at = created_at if created_at else QuizJob._now()
+        self.updated_at = updated_at if updated_at else self.created_at
+        self._id = _id if _id else ObjectId()
+
+    def to_dict(self):
+        return {
+            '_id': str(self._id),
+            'student_id': self.student_id,
+            'primary_skill': self.primary_skill,
+            'target_skill_gap': self.target_skill_gap,
+            'status': self.status,
+            'quiz_id': self.quiz_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+    @staticmethod
+    def from_dict(data):
+        return QuizJob(
+            student_id=data.get('student_id'),
+            primary_skill=data.get('primary_skill'),
+            target_skill_gap=data.get('target_skill_gap'),
+            status=data.get('status', "PENDING"),
+            quiz_id=data.get('quiz_id'),
+            error=data.get('error'),
+            created_at=QuizJob._parse_datetime(data.get('created_at')),
+            updated_at=QuizJob._parse_datetime(data.get('updated_at')),
+            _id=data.get('_id')
+        )
+
+    @staticmethod
+    def _now():
+        """utcnow at the millisecond precision of BSON dates, so the stored updated_at equals ours (see expire_if_stale)."""
+        now = datetime.datetime.utcnow()
+        return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    @staticmethod
+    def _parse_datetime(value):
+        if isinstance(value, str):
+            return datetime.datetime.fromisoformat(value)
+        return value
+
+    def insert(self):
+        jobs_collection = get_collection(self.collection_name)
+        job_data = self.to_dict()
+        job_data['_id'] = self._id
+        job_data['created_at'] = self.created_at
+        job_data['updated_at'] = self.updated_at
+        jobs_collection.insert_one(job_data)
+        return self
+
+    def _update_status(self, status, **fields):
+        self.status = status
+        self.updated_at = QuizJob._now()
+        for field, value in fields.items():
+            setattr(self, field, value)
+        jobs_collection = get_collection(self.collection_name)
+        jobs_collection.update_one(
+            {'_id': self._id},
+            {'$set': {'status': status, 'updated_at': self.updated_at, **fields}}
+        )
+
+    def mark_running(self):
+        self._update_status('RUNNING')
+
+    def mark_done(self, quiz_id):
+        self._update_status('DONE', quiz_id=str(quiz_id))
+
+    def mark_failed(self, error):
+        self._update_status('FAILED', error=error)
+
+    def expire_if_stale(self, timeout_seconds):
+        """
+        Marks a PENDING/RUNNING job FAILED when it has not moved for timeout_seconds, longer than any generation
+        takes: the worker running it is gone. Only applies if the job is still as it was loaded, so a worker that
+        just picked it up is not overridden. Returns True if the job is now FAILED because of this.
+        """
+        if self.status not in ('PENDING', 'RUNNING'):
+            return False
+        if self.updated_at > datetime.datetime.utcnow() - datetime.timedelta(seconds=timeout_seconds):
+            return False
+        jobs_collection = get_collection(self.collection_name)
+        now = QuizJob._now()
+        # Jobs queued before updated_at was a date still hold the ISO string until backfill_dates converts them
+        result = jobs_collection.update_one(
+            {'_id': self._id, 'status': self.status, 'updated_at': {'$in': [self.updated_at, self.updated_at.isoformat()]}},
+            {'$set': {'status': 'FAILED', 'error': self.STALE_ERROR, 'updated_at': now}}
+        )
+        if result.modified_count != 1:
+            return False
+        self.status, self.error, self.updated_at = 'FAILED', self.STALE_ERROR, now
+        return True
+
+    @staticmethod
+    def find_by_id(job_id):
+        jobs_collection = get_collection(QuizJob.collection_name)
+        job_data = jobs_collection.find_one({'_id': ObjectId(job_id)})
+        return QuizJob.from_dict(job_data) if job_data else None
@@ -0,0 +1,129 @@
+from services.database_service import get_collection, bump_collection_version
+import datetime
+import re
+
+_whitespace = re.compile(r'\s+')
+
+def normalize_skill_tag(tag):
+    """Lowercases and collapses whitespace so skill tags and badges compare cheaply."""
+    if not tag:
+        return ''
+    return _whitespace.sub(' ', str(tag)).strip().lower()
+
+# Words, keeping the symbols of skill names such as c++ and c#
+_token = re.compile(r'[a-z0-9][a-z0-9+#]*')
+# Words too common in gig titles and descriptions to say anything about the skill
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'have', 'help', 'i', 'in', 'is', 'it',
+    'me', 'my', 'need', 'needed', 'of', 'on', 'or', 'our', 'so', 'some', 'that', 'the', 'this', 'to', 'us',
+    'we', 'who', 'will', 'with', 'you', 'your'
+))
+
+def skill_tokens(text):
+    """The distinct lowercased words of `text` minus stop words, the terms of the recommendation index."""
+    if not text:
+        return set()
+    return {token for token in _token.findall(str(text).lower()) if token not in STOP_WORDS}
+
+
+class SkillIndex:
+    """
+    Badge -> skill tags it unlocks. A badge unlocks every gig skill tag it is a substring of
+    (normalized), which is the rule the gig routes used to evaluate per request.
+    One document per badge: {'_id': badge_key, 'tags': [skill_key, ...]}.
+    The substring matching only runs on writes: when a new badge is earned and when a gig
+    with a skill tag we have not seen before is saved. Tags already seen are recorded in
+    skill_tags ({'_id': skill_key, 'first_seen': date}), so saving a gig with a known tag costs one upsert.
+    """
+    collection_name = 'skill_unlocks'
+    tags_collection_name = 'skill_tags'
+
+    @staticmethod
+    def register_badge(badge_key):
+        if not badge_key:
+            return
+        unlocks_collection = get_collection(SkillIndex.collection_name)
+        # Upsert before reading the known tags so a concurrent register_tag either sees this badge or is seen by it
+        result = unlocks_collection.update_one({'_id': badge_key}, {'$setOnInsert': {'tags': []}}, upsert=True)
+        if result.upserted_id is None:
+            return
+        gigs_collection = get_collection('gigs')
+        tags = [tag for tag in gigs_collection.distinct('skill_key') if tag and badge_key in tag]
+        if tags:
+            unlocks_collection.update_one({'_id': badge_key}, {'$addToSet': {'tags': {'$each': tags}}})
+
+    @staticmethod
+    def register_tag(skill_key):
+        if not skill_key:
+            return
+        # Only the first gig with a tag matches it against the badges; upserted_id tells which one that is
+        result = get_collection(SkillIndex.tags_collection_name).update_one(
+            {'_id': skill_key}, {'$setOnInsert': {'first_seen': datetime.datetime.utcnow()}}, upsert=True)
+        if result.upserted_id is None:
+            return
+        unlocks_collection = get_collection(SkillIndex.collection_name)
+        matching_badges = [badge['_id'] for badge in unlocks_collection.find({'tags': {'$ne': skill_key}}, {'_id': 1})
+                           if badge['_id'] in skill_key]
+        if matching_badges:
+            unlocks_collection.update_many({'_id': {'$in': matching_badges}}, {'$addToSet': {'tags': skill_key}})
+
+    @staticmethod
+    def unlocked_tags(badge_keys):
+        """Returns the set of normalized skill tags unlocked by the given badge keys (one query)."""
+        if not badge_keys:
+            return set()
+        unlocks_collection = get_collection(SkillIndex.collection_name)
+        unlocked = set()
+        found = set()
+        for badge in unlocks_collection.find({'_id': {'$in': list(badge_keys)}}, {'tags': 1}):
+            found.add(badge['_id'])
+            unlocked.update(badge.get('tags', []))
+        # Badges earned before the index existed are registered the first time they are looked up
+        missing = set(badge_keys) - found
+        if missing:
+            for badge_key in missing:
+                SkillIndex.register_badge(badge_key)
+            for badge in unlocks_collection.find({'_id': {'$in': list(missing)}}, {'tags': 1}):
+                unlocked.update(badge.get('tags', []))
+        return unlocked
+
+    @staticmethod
+    def backfill_skill_keys():
+        """
+        Sets skill_key on gigs stored before it existed and registers their tags, so badges unlock them.
+        Only reads gigs without a skill_key, so once done it is a single empty index lookup; run by the warm-up.
+        Returns the number of gigs updated.
+        """
+        gigs_collection = get_collection('gigs')
+        updated = 0
+        new_keys = set()
+        for gig in gigs_collection.find({'skill_key': {'$exists': False}}, {'required_skill_tag': 1}):
+            skill_key = normalize_skill_tag(gig.get('required_skill_tag'))
+            gigs_collection.update_one({'_id': gig['_id'], 'skill_key': {'$exists': False}}, {'$set': {'skill_key': skill_key}})
+            new_keys.add(skill_key)
+            updated += 1
+        for skill_key in new_keys:
+            SkillIndex.register_tag(skill_key)
+        if updated:
+            # Gig listings' is_unlocked may have changed
+            bump_collection_version('gigs')
+        return updated
+
+    @staticmethod
+    def rebuild():
+        """Backfills skill_key / badge_keys on existing documents and rebuilds the unlock index."""
+        users_collection = get_collection('users')
+        SkillIndex.backfill_skill_keys()
+
+        badge_keys = set()
+        for user in users_collection.find({'badges.0': {'$exists': True}}, {'badges': 1}):
+            keys = sorted({normalize_skill_tag(badge) for badge in user['badges']})
+            users_collection.update_one({'_id': user['_id']}, {'$set': {'badge_keys': keys}})
+            badge_keys.update(keys)
+
+        get_collection(SkillIndex.collection_name).delete_many({})
+        for badge_key in badge_keys:
+            SkillIndex.register_badge(badge_key)
+        # Gig listings' is_unlocked may have changed
+        bump_collection_version('gigs')
+        return len(badge_keys)
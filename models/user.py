@@ -1,20 +1,50 @@
-from services.database_service import get_collection
-from werkzeug.security import generate_password_hash, check_password_hash
+from services.database_service import get_collection, changed_fields, persisted_snapshot
+from services.cache_service import user_cache
+from services import password_service
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from models.skill import normalize_skill_tag, SkillIndex
+from models.persistence import PersistedModel
 
-class User:
+# Snapshot of users built from a user_cache entry: the entry may be stale and has no password_hash, so it is no baseline for save()
+_FROM_CACHE = ()
+
+class User(PersistedModel):
+    __slots__ = ('username', 'email', 'password_hash', 'role', 'primary_skill', 'badges', 'badge_keys',
+                 'wallet_balance', 'verification_status', 'committed_balance', 'version', '_id', '_persisted')
     collection_name = 'users'
 
-    def __init__(self, username, email, password_hash, role, primary_skill=None, badges=None, wallet_balance=0.0, verification_status="Unverified", _id=None):
+    # Also what keeps two accounts from sharing an email when signups race
+    indexes = [
+        {'keys': [('email', 1)], 'unique': True},
+    ]
+    # Compared by save(). committed_balance and version only change through $inc, so save() never sends them
+    stored_fields = ('username', 'email', 'password_hash', 'role', 'primary_skill', 'badges', 'badge_keys',
+                     'wallet_balance', 'verification_status')
+    # Login and signup; every other lookup goes by _id
+    query_shapes = {
+        'find_by_email': ['email'],
+    }
+
+    def __init__(self, username, email, password_hash, role, primary_skill=None, badges=None, wallet_balance=0.0, verification_status="Unverified", badge_keys=None, committed_balance=None, version=0, _id=None):
         self.username = username
         self.email = email
         self.password_hash = password_hash
         self.role = role 
         self.primary_skill = primary_skill
         self.badges = badges if badges is not None else []
+        # Normalized badges, used for skill unlock lookups (see models/skill.py)
+        self.badge_keys = badge_keys if badge_keys is not None else sorted({normalize_skill_tag(badge) for badge in self.badges})
         self.wallet_balance = wallet_balance
         self.verification_status = verification_status
+        # Sum of the employer's POSTED/ESCROWED gig prices. Only ever changed with $inc (see reserve_gig_funds),
+        # None until loaded for users created before it was tracked.
+        self.committed_balance = committed_balance
+        # Incremented by every write to the user's public fields, used for ETags (0 for users stored before it was tracked)
+        self.version = version
         self._id = _id if _id else ObjectId()
+        # Snapshot of the document as last loaded or saved (see persisted_snapshot), None until the user is in the database (see save)
+        self._persisted = None
 
     def to_dict(self, include_password=False):
         data = {
@@ -33,7 +63,7 @@ class User:
 
     @staticmethod
     def from_dict(data):
-        return User(
+        user = User(
             username=data.get('username'),
             email=data.get('email'),
             password_hash=data.get('password_hash'),
@@ -42,27 +72,124 @@ class User:
             badges=data.get('badges'),
             wallet_balance=data.get('wallet_balance'),
             verification_status=data.get('verification_status', "Unverified"),
+            badge_keys=data.get('badge_keys'),
+            committed_balance=data.get('committed_balance'),
+            version=data.get('version', 0),
             _id=data.get('_id')
         )
+        user._persisted = persisted_snapshot(data, User.stored_fields)
+        return user
+
+    def _to_document(self):
+        user_data = self.to_dict(include_password=True)
+        user_data['_id'] = ObjectId(user_data['_id'])
+        user_data['badge_keys'] = self.badge_keys
+        return user_data
 
     def save(self):
+        """Inserts a new user, or $sets only the fields changed since it was loaded, bumping its version. One round trip either way."""
         users_collection = get_collection(self.collection_name)
-        user_data = self.to_dict(include_password=True)
-        if '_id' in user_data:
-            user_data['_id'] = ObjectId(user_data['_id'])
-        
-        if users_collection.find_one({'_id': self._id}):
-            users_collection.update_one({'_id': self._id}, {'$set': user_data})
-        else:
+        if self._persisted is _FROM_CACHE:
+            raise RuntimeError("Users from find_by_id_cached are read-only, load them with find_by_id to save them.")
+        user_data = self._to_document()
+
+        if self._persisted is None:
+            user_data['committed_balance'] = self.committed_balance = self.committed_balance or 0.0
+            user_data['version'] = self.version = 1
             users_collection.insert_one(user_data)
+        else:
+            changes = changed_fields(self._persisted, self.stored_fields, user_data)
+            if changes:
+                users_collection.update_one({'_id': user_data['_id']}, {'$set': changes, '$inc': {'version': 1}})
+                user_cache.invalidate(self._id)
+                self.version += 1
+        self._persisted = persisted_snapshot(user_data, self.stored_fields)
         return self
 
+    def ensure_committed_balance(self):
+        """Backfills committed_balance from the employer's gigs the first time it is needed."""
+        if self.committed_balance is None:
+            from models.gig import Gig
+            users_collection = get_collection(self.collection_name)
+            users_collection.update_one(
+                {'_id': self._id, 'committed_balance': {'$exists': False}},
+                {'$set': {'committed_balance': Gig.committed_total(self._id)}}
+            )
+            user_cache.invalidate(self._id)
+            user_data = users_collection.find_one({'_id': self._id}, {'committed_balance': 1})
+            self.committed_balance = float(user_data.get('committed_balance') or 0.0)
+        return self.committed_balance
+
+    def available_balance(self):
+        """Wallet balance not held by POSTED/ESCROWED gigs."""
+        return float(self.wallet_balance) - self.ensure_committed_balance()
+
+    def reserve_gig_funds(self, amount):
+        """
+        Commits `amount` of the wallet to a new gig, only if the wallet still covers every committed gig.
+        Returns False (and changes nothing) when the balance is insufficient.
+        """
+        self.ensure_committed_balance()
+        users_collection = get_collection(self.collection_name)
+        user_data = users_collection.find_one_and_update(
+            {'_id': self._id, '$expr': {'$lte': [{'$add': ['$committed_balance', amount]}, '$wallet_balance']}},
+            {'$inc': {'committed_balance': amount}},
+            projection={'committed_balance': 1, 'wallet_balance': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not user_data:
+            return False
+        user_cache.invalidate(self._id)
+        self.committed_balance = user_data['committed_balance']
+        self.wallet_balance = user_data['wallet_balance']
+        self._mark_persisted(wallet_balance=self.wallet_balance)
+        return True
+
+    def release_gig_funds(self, amount):
+        """Releases funds committed to a gig, once it is paid out (or was never posted)."""
+        self.ensure_committed_balance()
+        users_collection = get_collection(self.collection_name)
+        user_data = users_collection.find_one_and_update(
+            {'_id': self._id},
+            {'$inc': {'committed_balance': -amount}},
+            projection={'committed_balance': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if user_data:
+            user_cache.invalidate(self._id)
+            self.committed_balance = user_data['committed_balance']
+
     @staticmethod
     def find_by_id(user_id):
         users_collection = get_collection(User.collection_name)
         user_data = users_collection.find_one({'_id': ObjectId(user_id)})
         return User.from_dict(user_data) if user_data else None
 
+    @staticmethod
+    def find_by_id_cached(user_id):
+        """
+        find_by_id through user_cache, for reads and targeted updates. Every write to a user invalidates its entry,
+        but entries are cached without the password hash and may lag another worker's write by up to the TTL,
+        so the user cannot be save()d: load it with find_by_id to change it.
+        """
+        user_data = user_cache.get(user_id)
+        if user_data is None:
+            users_collection = get_collection(User.collection_name)
+            user_data = users_collection.find_one({'_id': ObjectId(user_id)}, {'password_hash': 0})
+            if not user_data:
+                return None
+            user_cache.set(user_id, user_data)
+        user = User.from_dict(user_data)
+        user._persisted = _FROM_CACHE
+        return user
+
+    @staticmethod
+    def find_version(user_id):
+        """The user's version without loading the user (None if it does not exist), for conditional GETs."""
+        users_collection = get_collection(User.collection_name)
+        user_data = users_collection.find_one({'_id': ObjectId(user_id)}, {'version': 1})
+        return user_data.get('version', 0) if user_data else None
+
     @staticmethod
     def find_by_email(email):
         users_collection = get_collection(User.collection_name)
@@ -71,20 +198,77 @@ class User:
 
     @staticmethod
     def verify_password(hashed_password, password):
-        return check_password_hash(hashed_password, password)
+        return password_service.verify_password(hashed_password, password)
 
     @staticmethod
     def hash_password(password):
-        return generate_password_hash(password, method='pbkdf2:sha256')
+        return password_service.hash_password(password)
+
+    def upgrade_password_hash(self, password):
+        """After a successful login: rehashes legacy pbkdf2 (or outdated argon2) hashes with the current argon2 settings."""
+        if password_service.needs_rehash(self.password_hash):
+            self.password_hash = User.hash_password(password)
+            self.save()
+            password_service.record_rehash()
 
     def add_badge(self, badge_id):
+        if badge_id not in self.badges:
+            if self._persisted is None:
+                self.badges.append(badge_id)
+                badge_key = normalize_skill_tag(badge_id)
+                if badge_key not in self.badge_keys:
+                    self.badge_keys.append(badge_key)
+                self.save()
+                SkillIndex.register_badge(badge_key)
+            else:
+                users_collection = get_collection(self.collection_name)
+                users_collection.update_one(*self._badge_update(badge_id))
+                self._badge_awarded(badge_id)
+
+    def _badge_update(self, badge_id):
+        """(filter, update) awarding a badge. $addToSet makes it idempotent, so it is safe to retry in a transaction."""
+        return {'_id': self._id}, {'$addToSet': {'badges': badge_id, 'badge_keys': normalize_skill_tag(badge_id)}, '$inc': {'version': 1}}
+
+    def _badge_awarded(self, badge_id):
+        """Mirrors a written _badge_update on this object, then registers the badge for skill unlocks."""
+        badge_key = normalize_skill_tag(badge_id)
+        user_cache.invalidate(self._id)
+        self.version += 1
         if badge_id not in self.badges:
             self.badges.append(badge_id)
-            self.save() # Persist the change
+        if badge_key not in self.badge_keys:
+            self.badge_keys.append(badge_key)
+        self._mark_persisted(badges=self.badges, badge_keys=self.badge_keys)
+        SkillIndex.register_badge(badge_key)
 
     def update_wallet_balance(self, amount, action):
+        """
+        Adds to or subtracts from the wallet with a server-side $inc, so concurrent updates are never lost.
+        A subtraction only applies if the remaining balance still covers the funds committed to gigs;
+        returns False (and changes nothing) otherwise.
+        """
+        query = {'_id': self._id}
         if action == 'add':
-            self.wallet_balance += amount
+            delta = amount
         elif action == 'subtract':
-            self.wallet_balance -= amount
-        self.save() # Persist the change
\ No newline at end of file
+            self.ensure_committed_balance()
+            query['$expr'] = {'$gte': [{'$subtract': ['$wallet_balance', '$committed_balance']}, amount]}
+            delta = -amount
+        else:
+            raise ValueError(f"Unknown wallet action: {action}")
+
+        users_collection = get_collection(self.collection_name)
+        user_data = users_collection.find_one_and_update(
+            query,
+            {'$inc': {'wallet_balance': delta, 'version': 1}},
+            projection={'wallet_balance': 1, 'committed_balance': 1, 'version': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not user_data:
+            return False
+        user_cache.invalidate(self._id)
+        self.wallet_balance = user_data['wallet_balance']
+        self.committed_balance = user_data.get('committed_balance', self.committed_balance)
+        self.version = user_data['version']
+        self._mark_persisted(wallet_balance=self.wallet_balance)
+        return True
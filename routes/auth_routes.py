@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify, current_app
 from models.user import User
+from services.etag_service import make_etag, not_modified, with_etag
 import jwt
 import datetime
 from functools import wraps
+import hmac
+from pymongo.errors import DuplicateKeyError
 
 auth_bp = Blueprint('auth_bp', __name__)
 
@@ -19,7 +22,7 @@ def token_required(f):
 
         try:
             data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.find_by_id(data['public_id'])
+            current_user = User.find_by_id_cached(data['public_id'])
             if not current_user:
                 return jsonify({'message': 'Token is invalid: User not found!'}), 401
         except jwt.ExpiredSignatureError:
@@ -32,6 +35,18 @@ def token_required(f):
         return f(current_user, *args, **kwargs)
     return decorated
 
+# For the bulk export endpoints, used by service clients (analytics sync) with a shared key instead of a user token
+def export_key_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        export_key = current_app.config.get('EXPORT_API_KEY')
+        if not export_key:
+            return jsonify({'message': 'Exports are not enabled.'}), 403
+        if not hmac.compare_digest(request.headers.get('x-export-key', ''), export_key):
+            return jsonify({'message': 'Export key is missing or invalid!'}), 401
+        return f(*args, **kwargs)
+    return decorated
+
 # For Role Required Endpoints
 def role_required(allowed_roles):
     def decorator(f):
@@ -75,7 +90,11 @@ def signup():
         primary_skill=primary_skill if role == 'Student' else None,
         verification_status="Verified" if current_app.config.get('MOCK_VERIFICATION', False) else "Unverified"
     )
-    new_user.save()
+    try:
+        new_user.save()
+    except DuplicateKeyError:
+        # Another signup with this email won the race (users.email is a unique index)
+        return jsonify({'message': 'User with this email already exists.'}), 409
 
     if current_app.config.get('MOCK_VERIFICATION', False):
         new_user.verification_status = "Verified"
@@ -101,6 +120,7 @@ def login():
 
     if not user or not User.verify_password(user.password_hash, password):
         return jsonify({'message': 'Invalid email or password.'}), 401
+    user.upgrade_password_hash(password)
 
     token = jwt.encode(
         {
@@ -119,11 +139,19 @@ def login():
 @token_required
 def get_user_profile(current_user):
     if request.method == 'GET':
-        return jsonify(current_user.to_dict()), 200
+        etag = make_etag('user', current_user._id, current_user.version)
+        response = not_modified(etag)
+        if response:
+            return response
+        return with_etag(jsonify(current_user.to_dict()), etag), 200
     elif request.method == 'PATCH':
         data = request.get_json()
         if not data:
             return jsonify({'message': 'No data provided.'}), 400
+        # The cached user is no baseline for save(), change the stored one
+        current_user = User.find_by_id(current_user._id)
+        if not current_user:
+            return jsonify({'message': 'Token is invalid: User not found!'}), 401
 
         if 'username' in data:
             current_user.username = data.get('username')
@@ -143,7 +171,10 @@ def get_user_profile(current_user):
             else:
                 return jsonify({'message': 'Primary skill can only be set for Students.'}), 400
 
-        current_user.save()
+        try:
+            current_user.save()
+        except DuplicateKeyError:
+            return jsonify({'message': 'Email already in use.'}), 409
         return jsonify({'message': 'Profile updated successfully.', 'user': current_user.to_dict()}), 200
 
 # Get Any User Profile
@@ -151,10 +182,19 @@ def get_user_profile(current_user):
 @token_required
 @role_required(['Employer', 'Student'])
 def get_any_user_profile(current_user, user_id):
+    # A revalidation only needs the user's version, not the user
+    if request.if_none_match:
+        version = User.find_version(user_id)
+        if version is None:
+            return jsonify({'message': 'User not found.'}), 404
+        response = not_modified(make_etag('user', user_id, version))
+        if response:
+            return response
+
     user = User.find_by_id(user_id)
     if not user:
         return jsonify({'message': 'User not found.'}), 404
-    return jsonify(user.to_dict()), 200
+    return with_etag(jsonify(user.to_dict()), make_etag('user', user_id, user.version)), 200
 
 # Update Password
 @auth_bp.route('/update_password', methods=['PATCH'])
@@ -170,6 +210,10 @@ def update_password(current_user):
     if not current_password or not new_password:
         return jsonify({'message': 'Current password and new password are required.'}), 400
 
+    # Cached users carry no password hash
+    current_user = User.find_by_id(current_user._id)
+    if not current_user:
+        return jsonify({'message': 'Token is invalid: User not found!'}), 401
     if not User.verify_password(current_user.password_hash, current_password):
         return jsonify({'message': 'Current password is incorrect.'}), 401
 
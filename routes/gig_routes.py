@@ -1,13 +1,61 @@
-from flask import Blueprint, request, jsonify, current_app
-from models.gig import Gig
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from models.gig import Gig, InvalidCursorError
 from models.user import User
 from models.quiz import Quiz
-from routes.auth_routes import token_required, role_required
-from services.ai_service import generate_quiz, AIServiceError
+from models.quiz_job import QuizJob
+from models.skill import SkillIndex, normalize_skill_tag
+from routes.auth_routes import token_required, role_required, export_key_required
+from services.quiz_job_service import submit_quiz_job, take_banked_quiz, QuizQueueFullError, QuizRateLimitedError
+from services.payment_service import settle_gig, settle_gigs, PaymentError
+from services.grading_service import grade_quiz, GradingError
+from services.database_service import get_collection_version
+from services.etag_service import make_etag, not_modified, with_etag
+from services.json_provider import dumps_line
 from bson.objectid import ObjectId
 
 gig_bp = Blueprint('gig_bp', __name__)
 
+def parse_gig_fields(raw_fields):
+    """Splits a comma separated `fields` argument, raising ValueError on fields that cannot be listed."""
+    if not raw_fields:
+        return None
+    fields = [field.strip() for field in raw_fields.split(',') if field.strip()]
+    unknown_fields = [field for field in fields if field not in Gig.listable_fields]
+    if unknown_fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown_fields)}")
+    return fields
+
+def parse_new_gig(data):
+    """Validates a new gig's fields. Returns (Gig fields, None), or (None, error message)."""
+    if not isinstance(data, dict):
+        return None, 'Invalid JSON data.'
+    title = data.get('title')
+    description = data.get('description')
+    price = data.get('price')
+    required_skill_tag = data.get('required_skill_tag')
+
+    if not all([title, description, price, required_skill_tag]):
+        return None, 'Missing required fields: title, description, price, required_skill_tag'
+
+    try:
+        price = float(price)
+        if price <= 0:
+            return None, 'Price must be a positive number.'
+    except (TypeError, ValueError):
+        return None, 'Price must be a valid number.'
+    return {'title': title, 'description': description, 'price': price, 'required_skill_tag': required_skill_tag}, None
+
+def unlock_context(user):
+    """What a gig's is_unlocked depends on for `user`: students' badges, nothing for other roles."""
+    return ','.join(user.badge_keys) if user.role == 'Student' else user.role
+
+def ndjson_response(documents):
+    """Streams documents as newline-delimited JSON, one line per document, as the cursor yields them."""
+    def generate():
+        for document in documents:
+            yield dumps_line(document)
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 # Post Gig
 @gig_bp.route('/', methods=['POST'])
 @token_required
@@ -17,72 +65,292 @@ def post_gig(current_user):
     if not data:
         return jsonify({'message': 'Invalid JSON data.'}), 400
 
-    title = data.get('title')
-    description = data.get('description')
-    price = data.get('price')
-    required_skill_tag = data.get('required_skill_tag')
+    gig_fields, error = parse_new_gig(data)
+    if error:
+        return jsonify({'message': error}), 400
+    price = gig_fields['price']
 
-    if not all([title, description, price, required_skill_tag]):
-        return jsonify({'message': 'Missing required fields: title, description, price, required_skill_tag'}), 400
+    if not current_user.reserve_gig_funds(price):
+        return jsonify({'message': 'Insufficient wallet balance to post this gig.'}), 400
 
-    employer_gigs_price = 0
-    employer_gigs = Gig.find_by_employer(current_user._id)
-    for gig in employer_gigs:
-        if gig.status in ['POSTED', 'ESCROWED']:
-            employer_gigs_price += gig.price
-    
+    new_gig = Gig(employer_id=str(current_user._id), **gig_fields)
     try:
-        price = float(price)
-        if price <= 0:
-            return jsonify({'message': 'Price must be a positive number.'}), 400
-
-        if price + employer_gigs_price > float(current_user.wallet_balance):
-            return jsonify({'message': 'Insufficient wallet balance to post this gig.'}), 400
-    except ValueError:
-        return jsonify({'message': 'Price must be a valid number.'}), 400
-
-    new_gig = Gig(
-        title=title,
-        description=description,
-        price=price,
-        required_skill_tag=required_skill_tag,
-        employer_id=str(current_user._id)
-    )
-    new_gig.save()
+        new_gig.save()
+    except Exception:
+        current_user.release_gig_funds(price)
+        raise
     return jsonify({'message': 'Gig posted successfully!', 'gig': new_gig.to_dict()}), 201
 
-# Get Gigs
+def parse_bulk_items(data, key):
+    """The `key` list of a bulk request body, or an error message."""
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, f'Provide a non-empty `{key}` list.'
+    if len(items) > current_app.config['GIGS_BULK_MAX_ITEMS']:
+        return None, f"At most {current_app.config['GIGS_BULK_MAX_ITEMS']} {key} per request."
+    return items, None
+
+# Bulk Post Gigs (validated, escrow-checked and inserted together)
+@gig_bp.route('/bulk', methods=['POST'])
+@token_required
+@role_required(['Employer'])
+def post_gigs_bulk(current_user):
+    items, error = parse_bulk_items(request.get_json(silent=True), 'gigs')
+    if error:
+        return jsonify({'message': error}), 400
+
+    results = [None] * len(items)
+    new_gigs = []
+    # Gigs are accepted in order while the available balance covers them, then reserved with a single $inc
+    available = current_user.available_balance()
+    for position, item in enumerate(items):
+        gig_fields, error = parse_new_gig(item)
+        if not error and gig_fields['price'] > available:
+            error = 'Insufficient wallet balance to post this gig.'
+        if error:
+            results[position] = {'index': position, 'status': 'error', 'message': error}
+            continue
+        available -= gig_fields['price']
+        new_gigs.append((position, Gig(employer_id=str(current_user._id), **gig_fields)))
+
+    total = sum(gig.price for _, gig in new_gigs)
+    if new_gigs and not current_user.reserve_gig_funds(total):
+        # The balance changed since it was read
+        for position, _ in new_gigs:
+            results[position] = {'index': position, 'status': 'error', 'message': 'Insufficient wallet balance to post this gig.'}
+        new_gigs = []
+
+    if new_gigs:
+        try:
+            failed = Gig.insert_many([gig for _, gig in new_gigs])
+        except Exception:
+            current_user.release_gig_funds(total)
+            raise
+        unsaved = sum(gig.price for i, (_, gig) in enumerate(new_gigs) if i in failed)
+        if unsaved:
+            current_user.release_gig_funds(unsaved)
+        for i, (position, gig) in enumerate(new_gigs):
+            if i in failed:
+                results[position] = {'index': position, 'status': 'error', 'message': 'Gig could not be saved.'}
+            else:
+                results[position] = {'index': position, 'status': 'created', 'gig': gig.to_dict()}
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    return jsonify({'message': f'{created} of {len(items)} gigs posted.', 'created': created, 'results': results}), 201 if created else 400
+
+# Get Gigs (cursor paginated, newest first)
 @gig_bp.route('/', methods=['GET'])
 @token_required
 def get_gigs(current_user):
-    gigs = Gig.find_all()
+    return gig_listing(current_user)
 
-    gigs_data = []
-    for gig in gigs:
-        gig_dict = gig.to_dict()
-        if current_user.role == 'Student':
-            gig_dict['is_unlocked'] = any(badge.lower() in gig.required_skill_tag.lower() for badge in current_user.badges)
+# Search Gigs (full-text, best matches first, cursor paginated)
+@gig_bp.route('/search', methods=['GET'])
+@token_required
+def search_gigs(current_user):
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'message': 'Missing search text: q'}), 400
+    if len(text) > current_app.config['GIGS_SEARCH_MAX_LENGTH']:
+        return jsonify({'message': f"Search text must be at most {current_app.config['GIGS_SEARCH_MAX_LENGTH']} characters."}), 400
+    return gig_listing(current_user, search_text=text)
+
+# Recommended Gigs (POSTED gigs ranked against the student's primary skill and badges, cursor paginated)
+@gig_bp.route('/recommended', methods=['GET'])
+@token_required
+@role_required(['Student'])
+def get_recommended_gigs(current_user):
+    return gig_listing(current_user, recommend=True)
+
+def gig_listing(current_user, search_text=None, recommend=False):
+    """
+    A page of gigs for GET /api/gigs, of search results when search_text is given, or of the student's
+    recommendations when recommend is set.
+    """
+    args = request.args
+    try:
+        limit = int(args.get('limit', current_app.config['GIGS_PAGE_DEFAULT_LIMIT']))
+    except ValueError:
+        return jsonify({'message': 'Limit must be a whole number.'}), 400
+    if limit < 1 or limit > current_app.config['GIGS_PAGE_MAX_LIMIT']:
+        return jsonify({'message': f"Limit must be between 1 and {current_app.config['GIGS_PAGE_MAX_LIMIT']}."}), 400
+
+    try:
+        # Listable fields only by default, never bookkeeping ones such as version or settlement_id
+        fields = parse_gig_fields(args.get('fields')) or list(Gig.listable_fields)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Conditional GET, answered from the gigs collection version before any gig or skill index lookup
+    etag_parts = [request.path, get_collection_version(Gig.collection_name), unlock_context(current_user), request.query_string.decode()]
+    if recommend:
+        # Rankings also depend on the primary skill
+        etag_parts.append(current_user.primary_skill or '')
+    etag = make_etag(*etag_parts)
+    response = not_modified(etag)
+    if response:
+        return response
+
+    # None means every gig is unlocked (non-students)
+    unlocked_skill_keys = None
+    if current_user.role == 'Student':
+        unlocked_skill_keys = SkillIndex.unlocked_tags(current_user.badge_keys)
+    unlocked_only = args.get('unlocked_only', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        query = Gig.build_filter(
+            # Recommendations are POSTED gigs only
+            status=args.get('status').split(',') if args.get('status') and not recommend else None,
+            skill_tag=args.get('skill'),
+            employer_id=args.get('employer_id'),
+            min_price=args.get('min_price'),
+            max_price=args.get('max_price'),
+            unlocked_skill_keys=unlocked_skill_keys if unlocked_only else None
+        )
+    except ValueError:
+        return jsonify({'message': 'min_price and max_price must be valid numbers.'}), 400
+
+    try:
+        if recommend:
+            profile_terms = Gig.profile_terms(current_user.primary_skill, current_user.badges)
+            gigs, next_cursor = Gig.recommend_page(profile_terms, query, top_k=current_app.config['GIGS_RECOMMENDED_TOP_K'],
+                                                   limit=limit, cursor=args.get('cursor'), fields=fields)
+        elif search_text:
+            gigs, next_cursor = Gig.search_page(search_text, query, limit=limit, cursor=args.get('cursor'), fields=fields)
         else:
-            gig_dict['is_unlocked'] = True
-        gigs_data.append(gig_dict)
+            gigs, next_cursor = Gig.find_page(query, limit=limit, cursor=args.get('cursor'), fields=fields)
+    except InvalidCursorError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Raw documents go straight to the JSON provider, which encodes ObjectId/datetime itself
+    for gig in gigs:
+        skill_key = gig.pop('skill_key', None)
+        if skill_key is None and 'required_skill_tag' in gig:
+            # Not backfilled yet (see SkillIndex.backfill_skill_keys)
+            skill_key = normalize_skill_tag(gig['required_skill_tag'])
+        gig['is_unlocked'] = unlocked_skill_keys is None or skill_key in unlocked_skill_keys
+
+    return with_etag(jsonify({'gigs': gigs, 'next_cursor': next_cursor, 'limit': limit}), etag), 200
+
+# Employer Dashboard (per-status totals of the employer's gigs)
+@gig_bp.route('/dashboard', methods=['GET'])
+@token_required
+@role_required(['Employer'])
+def get_employer_dashboard(current_user):
+    summary = Gig.employer_summary(current_user._id)
+    statuses = summary['statuses']
+
+    def total(field, status_names):
+        return sum(statuses.get(status, {}).get(field, 0) for status in status_names)
 
-    return jsonify(gigs_data), 200
+    return jsonify({
+        'employer_id': str(current_user._id),
+        'statuses': statuses,
+        'total_gigs': total('count', statuses),
+        'open_gigs': total('count', ['POSTED']),
+        'escrowed_total': total('total_price', ['ESCROWED', 'SETTLING']),
+        'committed_total': total('total_price', Gig.committed_statuses),
+        'paid_out_total': total('total_price', ['PAID']),
+        'applicant_count': total('applicants', statuses),
+        'wallet_balance': current_user.wallet_balance,
+        'generated_at': summary['generated_at']
+    }), 200
+
+# Gig Export (NDJSON stream of the whole catalog, for the analytics sync)
+@gig_bp.route('/export', methods=['GET'])
+@export_key_required
+def export_gigs():
+    args = request.args
+    try:
+        fields = parse_gig_fields(args.get('fields')) or list(Gig.listable_fields)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    try:
+        query = Gig.build_filter(
+            status=args.get('status').split(',') if args.get('status') else None,
+            skill_tag=args.get('skill'),
+            employer_id=args.get('employer_id'),
+            min_price=args.get('min_price'),
+            max_price=args.get('max_price')
+        )
+    except ValueError:
+        return jsonify({'message': 'min_price and max_price must be valid numbers.'}), 400
+
+    # Gigs stream in _id order, so the last _id received is enough to resume an interrupted export
+    resume_after = args.get('resume_after')
+    if resume_after:
+        if not ObjectId.is_valid(resume_after):
+            return jsonify({'message': 'resume_after must be a gig _id.'}), 400
+        query['_id'] = {'$gt': ObjectId(resume_after)}
+
+    gigs = Gig.iter_raw(query, fields=['_id'] + fields, sort=[('_id', 1)], batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+    return ndjson_response(gigs)
 
 # Get Gig Details
 @gig_bp.route('/<gig_id>', methods=['GET'])
 @token_required
 def get_gig_details(current_user, gig_id):
+    # A revalidation only needs the gig's version, not the gig
+    if request.if_none_match:
+        version = Gig.find_version(gig_id)
+        if version is None:
+            return jsonify({'message': 'Gig not found.'}), 404
+        response = not_modified(make_etag('gig', gig_id, version, unlock_context(current_user)))
+        if response:
+            return response
+
     gig = Gig.find_by_id(gig_id)
     if not gig:
         return jsonify({'message': 'Gig not found.'}), 404
 
     gig_dict = gig.to_dict()
-    if current_user.role == 'Student':
-        gig_dict['is_unlocked'] = any(badge.lower() in gig.required_skill_tag.lower() for badge in current_user.badges)
-    else:
-        gig_dict['is_unlocked'] = True
+    unlocked_skill_keys = SkillIndex.unlocked_tags(current_user.badge_keys) if current_user.role == 'Student' else None
+    gig_dict['is_unlocked'] = gig.is_unlocked_for(unlocked_skill_keys)
+
+    etag = make_etag('gig', gig_id, gig.version, unlock_context(current_user))
+    return with_etag(jsonify(gig_dict), etag), 200
 
-    return jsonify(gig_dict), 200
+# Bulk Approve Gig Payments (settled together, see settle_gigs)
+@gig_bp.route('/bulk/approve', methods=['POST'])
+@token_required
+@role_required(['Employer'])
+def approve_payments_bulk(current_user):
+    gig_ids, error = parse_bulk_items(request.get_json(silent=True), 'gig_ids')
+    if error:
+        return jsonify({'message': error}), 400
+    gig_ids = [str(gig_id) for gig_id in gig_ids]
+
+    errors = {}
+    gigs = Gig.find_by_ids([gig_id for gig_id in gig_ids if ObjectId.is_valid(gig_id)])
+    payable = []
+    for gig_id in dict.fromkeys(gig_ids):
+        gig = gigs.get(gig_id)
+        if not gig:
+            errors[gig_id] = 'Gig not found.'
+        elif gig.employer_id != str(current_user._id):
+            errors[gig_id] = 'You are not the employer for this gig.'
+        elif gig.status != 'ESCROWED':
+            errors[gig_id] = 'Gig is not in an escrowed state for approval.'
+        elif not gig.claimed_by:
+            errors[gig_id] = 'No student has claimed this gig yet.'
+        else:
+            payable.append(gig)
+
+    errors.update(settle_gigs(payable, current_user))
+
+    results = []
+    for gig_id in dict.fromkeys(gig_ids):
+        if gig_id in errors:
+            results.append({'gig_id': gig_id, 'status': 'error', 'message': errors[gig_id]})
+        else:
+            results.append({'gig_id': gig_id, 'status': 'PAID', 'price': gigs[gig_id].price, 'claimed_by': gigs[gig_id].claimed_by})
+    settled = sum(1 for result in results if result['status'] == 'PAID')
+    return jsonify({
+        'message': f'{settled} of {len(results)} payments approved.',
+        'settled': settled,
+        'results': results,
+        'employer_wallet_balance': current_user.wallet_balance
+    }), 200 if settled else 400
 
 # Gig Application
 @gig_bp.route('/<gig_id>/apply', methods=['POST'])
@@ -93,7 +361,7 @@ def apply_for_gig(current_user, gig_id):
     if not gig:
         return jsonify({'message': 'Gig not found.'}), 404
 
-    if not any(badge.lower() in gig.required_skill_tag.lower() for badge in current_user.badges):
+    if not gig.is_unlocked_for(SkillIndex.unlocked_tags(current_user.badge_keys)):
         return jsonify({'message': 'You do not have the required skill badge for this gig.'}), 403
 
     if gig.status != 'POSTED':
@@ -131,10 +399,10 @@ def approve_payment(current_user, gig_id):
     if not student:
         return jsonify({'message': 'Assigned student not found.'}), 404
 
-    student.update_wallet_balance(gig.price, 'add')
-    current_user.update_wallet_balance(gig.price, 'subtract')
-    gig.status = 'PAID'
-    gig.save()
+    try:
+        settle_gig(gig, current_user, student)
+    except PaymentError as e:
+        return jsonify({'message': str(e)}), e.status_code
 
     return jsonify({
         'message': f'Payment of {gig.price} approved and transferred to {student.username}.',
@@ -160,29 +428,66 @@ def trigger_skill_synth_quiz(current_user):
     if not target_skill_gap:
         return jsonify({'message': 'Missing required field: target_skill_gap.'}), 400
 
+    # Served straight from the quiz bank when another student already generated this skill pair
+    quiz = take_banked_quiz(current_user._id, current_user.primary_skill, target_skill_gap)
+    if quiz:
+        return jsonify({'quiz_id': str(quiz._id), 'skill_name': quiz.skill_name, 'questions': quiz.questions}), 200
+
+    # AI service (AI Micro-Quiz Generation - P1 Feature), generated in the background so this worker never waits on it
     try:
-        # AI service (AI Micro-Quiz Generation - P1 Feature)
-        quiz_data = generate_quiz(
-            student_skills=[current_user.primary_skill],
+        job = submit_quiz_job(
+            student_id=current_user._id,
+            primary_skill=current_user.primary_skill,
             target_skill_gap=target_skill_gap
         )
+    except QuizQueueFullError as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '10'}
+    except QuizRateLimitedError as e:
+        return jsonify({'message': str(e)}), 429, {'Retry-After': str(e.retry_after)}
 
-        quiz = Quiz(
-            skill_name=quiz_data['skill_name'],
-            questions=quiz_data['questions'],
-            student_id=str(current_user._id)
-        )
-        quiz.save()
-
-        quiz_data['quiz_id'] = str(quiz._id)
+    return jsonify({'message': 'Quiz generation started.', 'job_id': str(job._id), 'status': job.status}), 202
 
-        return jsonify(quiz_data), 200
-    except AIServiceError as e:
-        current_app.logger.error(f"AI Service Error: {e}")
-        return jsonify({'message': f'Failed to generate quiz: {e}'}), 500
-    except Exception as e:
-        current_app.logger.error(f"An unexpected error occurred during quiz generation: {e}")
-        return jsonify({'message': 'An unexpected error occurred while generating the quiz.'}), 500
+# Quiz Generation Status
+@gig_bp.route('/skill-synth/quiz-jobs/<job_id>', methods=['GET'])
+@token_required
+@role_required(['Student'])
+def get_quiz_job(current_user, job_id):
+    if not ObjectId.is_valid(job_id):
+        return jsonify({'message': 'Quiz job not found.'}), 404
+    job = QuizJob.find_by_id(job_id)
+    if not job or job.student_id != str(current_user._id):
+        return jsonify({'message': 'Quiz job not found.'}), 404
+    # Jobs only run in the worker that queued them, so one that never finishes lost its worker
+    job.expire_if_stale(current_app.config['QUIZ_JOB_TIMEOUT_SECONDS'])
+
+    response = {'job_id': str(job._id), 'status': job.status}
+    if job.status == 'DONE':
+        quiz = Quiz.find_by_id(job.quiz_id)
+        if not quiz:
+            return jsonify({'message': 'Quiz not found.'}), 404
+        response['quiz'] = {'quiz_id': str(quiz._id), 'skill_name': quiz.skill_name, 'questions': quiz.questions}
+    elif job.status == 'FAILED':
+        response['message'] = job.error
+    return jsonify(response), 200
+
+# Quiz Export (NDJSON stream, for the analytics sync)
+@gig_bp.route('/skill-synth/quizzes/export', methods=['GET'])
+@export_key_required
+def export_quizzes():
+    args = request.args
+    query = {}
+    if args.get('student_id'):
+        query['student_id'] = args.get('student_id')
+    if args.get('skill_name'):
+        query['skill_name'] = args.get('skill_name')
+    resume_after = args.get('resume_after')
+    if resume_after:
+        if not ObjectId.is_valid(resume_after):
+            return jsonify({'message': 'resume_after must be a quiz _id.'}), 400
+        query['_id'] = {'$gt': ObjectId(resume_after)}
+
+    quizzes = Quiz.iter_raw(query, sort=[('_id', 1)], batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+    return ndjson_response(quizzes)
 
 # Quiz Submission
 @gig_bp.route('/skill-synth/submit-quiz', methods=['POST'])
@@ -201,16 +506,14 @@ def submit_skill_synth_quiz(current_user):
     if not isinstance(answers, list) or len(answers) != 3:
         return jsonify({'message': 'Answers must be a list of 3 indices.'}), 400
 
-    quiz = Quiz.find_by_id(quiz_id)
-    if not quiz:
+    if not ObjectId.is_valid(quiz_id):
         return jsonify({'message': 'Quiz not found.'}), 404
+    try:
+        passed, skill_name = grade_quiz(quiz_id, current_user, answers)
+    except GradingError as e:
+        return jsonify({'message': str(e)}), e.status_code
 
-    if quiz.student_id != str(current_user._id):
-        return jsonify({'message': 'You are not authorized to submit this quiz.'}), 403
-
-    correct_answers = [q['correct_answer_index'] for q in quiz.questions]
-    if answers == correct_answers:
-        current_user.add_badge(quiz.skill_name)
-        return jsonify({'message': f'Quiz submitted successfully! You have earned the {quiz.skill_name} badge.', 'badges': current_user.badges}), 200
+    if passed:
+        return jsonify({'message': f'Quiz submitted successfully! You have earned the {skill_name} badge.', 'badges': current_user.badges}), 200
     else:
         return jsonify({'message': 'Quiz failed. You did not earn the badge. Try again.'}), 200
\ No newline at end of file
@@ -1,6 +1,5 @@
 from flask import Blueprint, jsonify, request
 from routes.auth_routes import token_required, role_required
-from models.gig import Gig
 
 payment_bp = Blueprint('payment_bp', __name__)
 
@@ -32,26 +31,19 @@ def update_wallet(current_user, action):
         return jsonify({'message': 'Amount must be a valid number.'}), 400
     
     if action == 'topup':
-        current_user.wallet_balance += amount
-        current_user.save()
+        current_user.update_wallet_balance(amount, 'add')
         return jsonify({'message': 'Top-up successful!', 'new_balance': current_user.wallet_balance}), 200
 
     elif action == 'withdraw':
         if amount > float(current_user.wallet_balance):
             return jsonify({'message': 'Insufficient wallet balance for withdrawal.'}), 400
 
-        if current_user.role == 'Employer':
-            employer_gigs_price = 0
-            employer_gigs = Gig.find_by_employer(current_user._id)
-            for gig in employer_gigs:
-                if gig.status in ['POSTED', 'ESCROWED']:
-                    employer_gigs_price += gig.price
-            available_balance = float(current_user.wallet_balance) - employer_gigs_price
-            if amount > available_balance:
-                return jsonify({'message': 'Insufficient available balance for withdrawal due to posted/escrowed gigs.'}), 400
-
-        current_user.wallet_balance -= amount
-        current_user.save()
+        if current_user.role == 'Employer' and amount > current_user.available_balance():
+            return jsonify({'message': 'Insufficient available balance for withdrawal due to posted/escrowed gigs.'}), 400
+
+        # The balance may have changed since it was loaded; the $inc is conditional on the stored one
+        if not current_user.update_wallet_balance(amount, 'subtract'):
+            return jsonify({'message': 'Insufficient available balance for withdrawal.'}), 400
         return jsonify({'message': 'Withdrawal successful!', 'new_balance': current_user.wallet_balance}), 200
     
     else:
@@ -1,19 +1,153 @@
-import requests
 import json
 import re
+import threading
+import time
 from flask import current_app
+from services.metrics_service import ai_call_seconds
 
 class AIServiceError(Exception):
     pass
 
+# One pooled keep-alive session per process, so quiz generations reuse connections to the provider
+_session = None
+_session_lock = threading.Lock()
+
+# Per-process timing of provider calls (see get_ai_call_stats)
+_call_stats = {'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'last_seconds': None, 'budget_rejections': 0}
+_stats_lock = threading.Lock()
+
+# Per-process budget of provider calls, created on first use from the app config (see reserve_call_budget)
+_call_budget = None
+_budget_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, in bursts of up to `burst`. Thread safe."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, peek=False):
+        """
+        Takes a token. Returns 0.0 on success, else the seconds until one is available (nothing is taken).
+        With peek=True only reports whether a token is available, without taking it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                if not peek:
+                    self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+def get_http_session():
+    """
+    Returns the process-wide requests.Session for the AI provider, created on first use from the app config.
+    Connection errors and 429/5xx responses are retried by urllib3 with exponential backoff. A 429/5xx retry
+    re-sends the call, so it takes a call from the budget like any other (see BudgetedRetry).
+    requests is only imported here, so workers that never generate a quiz do not pay for it at startup.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            from urllib3.exceptions import MaxRetryError, ResponseError
+
+            class BudgetedRetry(Retry):
+                """Retry that gives up on a 429/5xx instead of re-sending it once the call budget is used up."""
+
+                def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+                    if response is not None and reserve_call_budget():
+                        raise MaxRetryError(_pool, url, ResponseError('AI call budget used up, not retrying'))
+                    return super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+
+            config = current_app.config
+            retry = BudgetedRetry(
+                total=config['AI_HTTP_MAX_RETRIES'],
+                backoff_factor=config['AI_HTTP_RETRY_BACKOFF'],
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['POST']),
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=config['AI_HTTP_POOL_SIZE'],
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def reset_http_session():
+    """Closes the pooled session, e.g. after the provider config changed or in a forked child."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def reserve_call_budget(peek=False):
+    """
+    Takes one provider call from the AI_CALLS_PER_MINUTE / AI_CALL_BURST budget of this process.
+    Returns 0.0 when the call may go ahead, else the seconds to wait before retrying. A rate of 0 disables the budget.
+    peek=True checks the budget without using it.
+    """
+    global _call_budget
+    config = current_app.config
+    if config['AI_CALLS_PER_MINUTE'] <= 0:
+        return 0.0
+    with _budget_lock:
+        if _call_budget is None:
+            _call_budget = TokenBucket(config['AI_CALLS_PER_MINUTE'] / 60.0, max(1, config['AI_CALL_BURST']))
+    retry_after = _call_budget.take(peek=peek)
+    if retry_after and not peek:
+        with _stats_lock:
+            _call_stats['budget_rejections'] += 1
+    return retry_after
+
+
+def _record_call(seconds, failed):
+    ai_call_seconds.observe(seconds, outcome='error' if failed else 'ok')
+    with _stats_lock:
+        _call_stats['calls'] += 1
+        if failed:
+            _call_stats['errors'] += 1
+        _call_stats['total_seconds'] += seconds
+        _call_stats['max_seconds'] = max(_call_stats['max_seconds'], seconds)
+        _call_stats['last_seconds'] = seconds
+
+
+def get_ai_call_stats():
+    with _stats_lock:
+        stats = dict(_call_stats)
+    stats['avg_seconds'] = stats['total_seconds'] / stats['calls'] if stats['calls'] else 0.0
+    return stats
+
 
 def generate_quiz(student_skills: str, target_skill_gap: str) -> dict:
     """
     Generate a skill-based quiz using OpenRouter (Gemini 2.5 Pro model).
     Enforces a strict JSON-only output and validates structure.
-    Retries once if the model output isn't valid JSON.
+    Transport errors are retried by the pooled session; output that isn't valid JSON is retried
+    (with a stricter prompt) up to AI_MAX_ATTEMPTS times with exponential backoff.
+    Callers reserve the first call with reserve_call_budget; each retry takes its own call from the budget.
     """
-    url = "https://openrouter.ai/api/v1/chat/completions"
+    config = current_app.config
+    url = f"{config['AI_BASE_URL'].rstrip('/')}/chat/completions"
     headers = {
         "Authorization": f"Bearer {current_app.config['OPEN_API_KEY']}",
         "Content-Type": "application/json",
@@ -66,20 +200,34 @@ def generate_quiz(student_skills: str, target_skill_gap: str) -> dict:
         return json.loads(content)
 
     def call_openrouter(payload):
-        response = requests.post(url, headers=headers, json=payload, timeout=25)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"].strip()
-
-    try:
-        content = call_openrouter(build_payload(clarify=False))
-        quiz_data = parse_json_response(content)
-    except Exception:
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = get_http_session().post(
+                url, headers=headers, json=payload,
+                timeout=(config['AI_HTTP_CONNECT_TIMEOUT'], config['AI_HTTP_READ_TIMEOUT'])
+            )
+            response.raise_for_status()
+            data = response.json()
+            failed = False
+            return data["choices"][0]["message"]["content"].strip()
+        finally:
+            elapsed = time.perf_counter() - started
+            _record_call(elapsed, failed)
+            current_app.logger.info(f"OpenRouter call took {elapsed:.2f}s{' (failed)' if failed else ''}")
+
+    max_attempts = max(1, config['AI_MAX_ATTEMPTS'])
+    for attempt in range(max_attempts):
         try:
-            content = call_openrouter(build_payload(clarify=True))
+            content = call_openrouter(build_payload(clarify=attempt > 0))
             quiz_data = parse_json_response(content)
+            break
         except Exception as e:
-            raise AIServiceError(f"OpenRouter returned invalid or non-JSON response after retry: {e}")
+            if attempt == max_attempts - 1:
+                raise AIServiceError(f"OpenRouter returned invalid or non-JSON response after {max_attempts} attempts: {e}")
+            if reserve_call_budget():
+                raise AIServiceError(f"OpenRouter returned invalid or non-JSON response and the call budget is used up: {e}")
+            time.sleep(config['AI_HTTP_RETRY_BACKOFF'] * (2 ** attempt))
 
     # === Data Validation ===
     required_keys = ["quiz_id", "skill_name", "questions"]
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from flask import Flask
+import threading
+import copy
+import time
+import bson
+
+class LocalCacheBackend:
+    """Per-process LRU cache with a TTL on every entry."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCacheBackend:
+    """Shared cache for all gunicorn workers. Needs the optional `redis` package."""
+
+    def __init__(self, url, ttl_seconds, prefix):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("A *_CACHE_REDIS_URL is set but the `redis` package is not installed.")
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return bson.decode(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, bson.encode(value), ex=self.ttl_seconds)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class DocumentCache:
+    """
+    Caches raw Mongo documents by id, with hit/miss counters.
+    Configured like the other extensions with init_app; disabled (every lookup a miss) until then.
+    """
+
+    def __init__(self, config_prefix):
+        self.config_prefix = config_prefix
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._counter_lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        ttl_seconds = app.config.get(f'{self.config_prefix}_TTL_SECONDS', 30)
+        if ttl_seconds <= 0:
+            self.backend = None
+        elif app.config.get(f'{self.config_prefix}_REDIS_URL'):
+            self.backend = RedisCacheBackend(app.config[f'{self.config_prefix}_REDIS_URL'], ttl_seconds, self.key_prefix())
+        else:
+            self.backend = LocalCacheBackend(app.config.get(f'{self.config_prefix}_MAX_ENTRIES', 1024), ttl_seconds)
+
+    def key_prefix(self):
+        """
+        Redis key namespace, one per cache so caches keyed by the same ids (a user _id is both a user_cache
+        and a dashboard_cache key) never read each other's entries: 'cashngo:user:', 'cashngo:dashboard:'.
+        """
+        name = self.config_prefix.lower()
+        if name.endswith('_cache'):
+            name = name[:-len('_cache')]
+        return f'cashngo:{name}:'
+
+    def _count(self, counter):
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        value = self.backend.get(str(key)) if self.backend else None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        if self.backend:
+            self.backend.set(str(key), value)
+
+    def invalidate(self, key):
+        if self.backend:
+            self.backend.delete(str(key))
+            self._count('invalidations')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Authenticated users, keyed by the token's public_id (see token_required)
+user_cache = DocumentCache('USER_CACHE')
+# Employer dashboard summaries, keyed by employer_id (see Gig.employer_summary)
+dashboard_cache = DocumentCache('DASHBOARD_CACHE')
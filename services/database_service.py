@@ -1,7 +1,11 @@
 from flask_pymongo import PyMongo
 from flask import Flask, current_app # We only need current_app
+from services.metrics_service import mongo_listener
+import copy
 
 mongo = PyMongo()
+# Cached result of supports_transactions()
+_supports_transactions = None
 
 def init_db(app: Flask):
     """Initializes the PyMongo extension with the Flask app."""
@@ -10,7 +14,16 @@ def init_db(app: Flask):
     
     # It's important to set the MONGO_URI in the app's config before initializing mongo
     app.config["MONGO_URI"] = app.config.get("MONGO_URI") 
-    mongo.init_app(app)
+    # Pool sizing for the threaded/gevent workers (see gunicorn.conf.py). waitQueueTimeoutMS makes a request
+    # fail fast instead of hanging when every pooled connection is busy.
+    mongo.init_app(
+        app,
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        connectTimeoutMS=app.config['MONGO_CONNECT_TIMEOUT_MS'],
+        waitQueueTimeoutMS=app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        event_listeners=[mongo_listener]
+    )
     print("MongoDB Initialized successfully.")
 
 def get_db():
@@ -27,6 +40,63 @@ def get_db():
                            "Check MONGO_URI in .env, MongoDB Atlas IP whitelist, and network connectivity.")
     return db_client
 
+def get_client():
+    """Returns the MongoClient behind `mongo`, needed to start sessions and transactions."""
+    return mongo.cx
+
+def supports_transactions() -> bool:
+    """
+    Multi-document transactions need a replica set or a sharded cluster.
+    Checked once per process with a `hello` command.
+    """
+    global _supports_transactions
+    if _supports_transactions is None:
+        hello = get_client().admin.command('hello')
+        _supports_transactions = bool(hello.get('setName')) or hello.get('msg') == 'isdbgrid'
+    return _supports_transactions
+
 def get_collection(collection_name: str):
     """Returns a specific MongoDB collection."""
-    return get_db()[collection_name]
\ No newline at end of file
+    return get_db()[collection_name]
+
+# Stands for a field the snapshotted document did not have, so it differs from any value
+_MISSING = object()
+
+def persisted_snapshot(document, fields):
+    """
+    The baseline changed_fields compares against: a tuple of `document`'s values for `fields` (a model's
+    stored_fields). Values are shared with the model, except lists and dicts, the values the models mutate
+    in place (badges.append, ...), which are copied one level deep. Items of those lists (quiz questions,
+    rec_terms) are replaced rather than edited, so they are shared too.
+    """
+    return tuple(copy.copy(value) if isinstance(value, (list, dict)) else value
+                 for value in (document.get(field, _MISSING) for field in fields))
+
+def changed_fields(snapshot, fields, current):
+    """
+    Returns the `fields` of `current` that differ from (or are missing in) `snapshot`, the persisted_snapshot
+    of the document as it was last loaded from or written to the database.
+    Used by the models to send only dirty fields in a single `$set`.
+    """
+    return {field: current[field] for field, original in zip(fields, snapshot) if field in current and original != current[field]}
+
+def mark_persisted(snapshot, fields, written):
+    """Returns `snapshot` with the `written` {field: value} of a targeted update, so the next save() does not send them again."""
+    if not snapshot:
+        return snapshot
+    written = persisted_snapshot(written, fields)
+    return tuple(original if value is _MISSING else value for original, value in zip(snapshot, written))
+
+# One {_id: collection name, version} counter per collection whose listings answer conditional GETs
+COLLECTION_VERSIONS = 'collection_versions'
+
+def bump_collection_version(collection_name: str):
+    """Called after every write to `collection_name`, so cached listings of it stop matching."""
+    versions_collection = get_collection(COLLECTION_VERSIONS)
+    versions_collection.update_one({'_id': collection_name}, {'$inc': {'version': 1}}, upsert=True)
+
+def get_collection_version(collection_name: str) -> int:
+    """The collection's write counter, 0 until its first write. A single lookup by _id."""
+    versions_collection = get_collection(COLLECTION_VERSIONS)
+    version_data = versions_collection.find_one({'_id': collection_name})
+    return version_data['version'] if version_data else 0
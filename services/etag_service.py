@@ -0,0 +1,21 @@
+from flask import current_app, request
+import hashlib
+
+
+def make_etag(*parts):
+    """ETag over the version counters (and anything else) a response is built from."""
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def with_etag(response, etag):
+    """Tags a response; clients must revalidate it (private: most bodies depend on the caller)."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag):
+    """A 304 when the request's If-None-Match already has `etag`, otherwise None."""
+    if request.if_none_match and request.if_none_match.contains_weak(etag):
+        return with_etag(current_app.response_class(status=304), etag)
+    return None
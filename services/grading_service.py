@@ -0,0 +1,42 @@
+from services.database_service import get_client, get_collection, supports_transactions
+from models.quiz import Quiz
+from models.user import User
+
+
+class GradingError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def grade_quiz(quiz_id, student, answers):
+    """
+    Grades a submission against the quiz's answer key, read with a projection (no question text or options).
+    A pass awards the quiz's badge and records the pass together: in one transaction on a replica set,
+    otherwise badge first, since its $addToSet is idempotent and a resubmission repairs a missing record.
+    Returns (passed, skill_name).
+    """
+    answer_key = Quiz.find_answer_key(quiz_id)
+    if not answer_key:
+        raise GradingError('Quiz not found.', status_code=404)
+    if answer_key['student_id'] != str(student._id):
+        raise GradingError('You are not authorized to submit this quiz.', status_code=403)
+
+    passed = answers == answer_key['answers']
+    skill_name = answer_key['skill_name']
+    if not passed:
+        Quiz.record_attempt(quiz_id, passed=False)
+    elif supports_transactions():
+        users_collection = get_collection(User.collection_name)
+
+        def award(session):
+            users_collection.update_one(*student._badge_update(skill_name), session=session)
+            Quiz.record_attempt(quiz_id, passed=True, session=session)
+
+        with get_client().start_session() as session:
+            session.with_transaction(award)
+        student._badge_awarded(skill_name)
+    else:
+        student.add_badge(skill_name)
+        Quiz.record_attempt(quiz_id, passed=True)
+    return passed, skill_name
@@ -0,0 +1,89 @@
+from services.database_service import get_collection
+from models.user import User
+from models.gig import Gig
+from models.quiz import Quiz
+from models.quiz_bank import QuizBank
+from models.quiz_job import QuizJob
+from pymongo.errors import OperationFailure
+from flask import current_app
+
+# Server error code for create_index on an existing index with different options
+INDEX_OPTIONS_CONFLICT = 85
+
+# Models declaring `indexes` (created by ensure_indexes at startup) and `query_shapes`, the fields each of their
+# lookups filters/sorts on (checked against the indexes by verify_indexes). Models may also declare `date_fields`
+# for backfill_dates.
+INDEXED_MODELS = (User, Gig, Quiz, QuizBank, QuizJob)
+
+
+def ensure_indexes():
+    """
+    Creates every declared index. create_index is a no-op for indexes that already exist, so this is safe
+    to run on every startup. An index that cannot be built (e.g. duplicate emails for the unique index)
+    is logged and skipped rather than stopping the app. Returns the names of the indexes in place.
+    TTL indexes take expireAfterSeconds from the config setting named by `expire_after_config`; when that
+    setting changes, the existing index is updated in place with collMod.
+    """
+    created = []
+    for model in INDEXED_MODELS:
+        collection = get_collection(model.collection_name)
+        for spec in model.indexes:
+            options = {key: value for key, value in spec.items() if key not in ('keys', 'expire_after_config')}
+            if 'expire_after_config' in spec:
+                options['expireAfterSeconds'] = current_app.config[spec['expire_after_config']]
+            try:
+                created.append(f"{model.collection_name}.{collection.create_index(spec['keys'], **options)}")
+            except OperationFailure as e:
+                if e.code == INDEX_OPTIONS_CONFLICT and 'expireAfterSeconds' in options:
+                    created.append(_update_ttl(collection, spec['keys'], options['expireAfterSeconds']))
+                    continue
+                current_app.logger.error(f"Could not create index {spec['keys']} on {model.collection_name}: {e}")
+    return created
+
+
+def backfill_dates():
+    """
+    Converts the `date_fields` still stored as ISO strings, from before they were BSON dates, so TTL indexes
+    expire those documents too and date comparisons match. Returns {collection name: dates converted}.
+    """
+    converted = {}
+    for model in INDEXED_MODELS:
+        collection = get_collection(model.collection_name)
+        for field in getattr(model, 'date_fields', ()):
+            result = collection.update_many(
+                {field: {'$type': 'string'}},
+                [{'$set': {field: {'$dateFromString': {'dateString': '$' + field}}}}]
+            )
+            converted[model.collection_name] = converted.get(model.collection_name, 0) + result.modified_count
+    return converted
+
+
+def _update_ttl(collection, keys, expire_after_seconds):
+    collection.database.command('collMod', collection.name, index={'keyPattern': dict(keys), 'expireAfterSeconds': expire_after_seconds})
+    current_app.logger.info(f"TTL of {keys} on {collection.name} set to {expire_after_seconds}s.")
+    return f"{collection.name}.{'_'.join(f'{field}_{direction}' for field, direction in keys)}"
+
+
+def _is_supported(shape, index_fields):
+    # Equality/sort fields can use an index when they are its leading fields, in any order
+    return len(index_fields) >= len(shape) and set(index_fields[:len(shape)]) == set(shape)
+
+
+def find_unindexed_queries():
+    """Returns (collection, query name, fields) for every declared query shape no existing index supports."""
+    unindexed = []
+    for model in INDEXED_MODELS:
+        index_info = get_collection(model.collection_name).index_information()
+        index_fields = [[field for field, _ in index['key']] for index in index_info.values()]
+        for query_name, shape in model.query_shapes.items():
+            if not any(_is_supported(shape, fields) for fields in index_fields):
+                unindexed.append((model.collection_name, query_name, shape))
+    return unindexed
+
+
+def verify_indexes():
+    """Logs a warning for every query shape without a supporting index. Returns True if there were none."""
+    unindexed = find_unindexed_queries()
+    for collection_name, query_name, shape in unindexed:
+        current_app.logger.warning(f"No index supports {collection_name} query '{query_name}' on {shape}; it will scan the collection.")
+    return not unindexed
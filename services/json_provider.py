@@ -0,0 +1,50 @@
+from flask.json.provider import DefaultJSONProvider
+from bson.objectid import ObjectId
+from bson.decimal128 import Decimal128
+import datetime
+import decimal
+import json
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(obj):
+    """Types Mongo documents contain that JSON does not: ObjectId, datetime and Decimal/Decimal128."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal128):
+        obj = obj.to_decimal()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_line(obj):
+    """One compact NDJSON line (bytes, newline included), for streamed responses. Independent of app.json."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+    return (json.dumps(obj, default=_default, separators=(',', ':')) + "\n").encode()
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """
+    jsonify that takes raw Mongo documents as they come off a cursor, so routes do not have to turn them
+    into models (or str() every ObjectId) first. Encodes with orjson when it is installed.
+    datetimes are ISO 8601 like the models' to_dict, not Flask's default HTTP date format.
+    """
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(orjson.dumps(obj, default=_default, option=option) + b"\n", mimetype=self.mimetype)
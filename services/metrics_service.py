@@ -0,0 +1,138 @@
+from flask import Flask, Response, g, request, has_request_context
+from pymongo import monitoring
+import hmac
+import threading
+import time
+
+# Request and Mongo latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Mongo round trips per request
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = ','.join(f'{name}="{value}"' for name, value in key)
+                prefix = labels + ',' if labels else ''
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{{labels}}} {series["count"]}')
+        return lines
+
+
+def _render_gauges(name, description, values):
+    """Renders a {stat name: number} dict as one gauge, labelled by `stat`."""
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} gauge"]
+    for stat, value in sorted(values.items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f'{name}{{stat="{stat}"}} {value}')
+    return lines
+
+
+request_seconds = Histogram('cashngo_request_seconds', 'HTTP request latency by route.', LATENCY_BUCKETS)
+mongo_command_seconds = Histogram('cashngo_mongo_command_seconds', 'MongoDB command latency by command and route.', LATENCY_BUCKETS)
+ai_call_seconds = Histogram('cashngo_ai_call_seconds', 'AI provider (OpenRouter) call latency.', LATENCY_BUCKETS + (25.0, 60.0))
+mongo_round_trips = Histogram('cashngo_mongo_round_trips_per_request', 'MongoDB commands issued per request, by route.', ROUND_TRIP_BUCKETS)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Times every MongoDB command and charges it to the request that issued it, tagged with its route.
+    Commands from background threads (quiz jobs, refills) are recorded under route="background".
+    """
+
+    def started(self, event):
+        pass
+
+    def _finished(self, event):
+        seconds = event.duration_micros / 1e6
+        route = 'background'
+        if has_request_context():
+            route = _route()
+            g.mongo_calls = g.get('mongo_calls', 0) + 1
+            g.mongo_seconds = g.get('mongo_seconds', 0.0) + seconds
+        mongo_command_seconds.observe(seconds, command=event.command_name, route=route)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+# Passed to the MongoClient in init_db
+mongo_listener = MongoCommandListener()
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def init_metrics(app: Flask, stat_sources=()):
+    """
+    Adds request timing, the Server-Timing header, N+1 warnings and GET /metrics to the app.
+    stat_sources are (name, description, callable returning {stat: value}) triples for the other per-process
+    stats (AI calls, password hashing, caches), rendered as gauges; they belong to this app only.
+    """
+    app.extensions['cashngo_metrics'] = {'stat_sources': list(stat_sources)}
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.mongo_calls = 0
+        g.mongo_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        route = _route()
+        request_seconds.observe(seconds, method=request.method, route=route, blueprint=request.blueprint or '', status=str(response.status_code))
+        mongo_round_trips.observe(g.mongo_calls, route=route)
+
+        if g.mongo_calls > app.config['METRICS_MONGO_CALLS_WARN']:
+            app.logger.warning(f"{request.method} {route} made {g.mongo_calls} MongoDB round trips (possible N+1).")
+        if app.config['METRICS_SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'app;dur={seconds * 1000:.1f}, '
+                f'mongo;dur={g.mongo_seconds * 1000:.1f};desc="{g.mongo_calls} round trips"'
+            )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        metrics_key = app.config.get('METRICS_API_KEY')
+        if not metrics_key:
+            return Response('Metrics are not enabled.\n', status=403, mimetype='text/plain')
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {metrics_key}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        lines = request_seconds.render() + mongo_command_seconds.render() + mongo_round_trips.render() + ai_call_seconds.render()
+        for name, description, source in app.extensions['cashngo_metrics']['stat_sources']:
+            lines += _render_gauges(name, description, source())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
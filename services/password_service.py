@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+from werkzeug.security import check_password_hash
+from flask import current_app
+import threading
+import time
+
+# argon2-cffi and hashlib's pbkdf2 both release the GIL while hashing, so a small pool of OS threads caps the
+# CPU spent on passwords per worker process while other requests keep running (see _make_executor for gevent).
+_executor = None
+_hasher = None
+_lock = threading.Lock()
+
+_hash_stats = {'hashes': 0, 'verifications': 0, 'rehashes': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+_stats_lock = threading.Lock()
+
+
+def _make_executor(max_workers):
+    """
+    Under gevent's monkey-patching, ThreadPoolExecutor threads are greenlets and a hash computed on one blocks
+    every request of the worker for its whole duration. gevent's own executor runs on native threads and its
+    futures yield to the hub while waiting, so hashing stays off the event loop there too.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        monkey = None
+    if monkey is not None and monkey.is_module_patched('threading'):
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+
+
+def _get_pool():
+    global _executor, _hasher
+    with _lock:
+        if _executor is None:
+            config = current_app.config
+            _hasher = PasswordHasher(
+                time_cost=config['ARGON2_TIME_COST'],
+                memory_cost=config['ARGON2_MEMORY_COST'],
+                parallelism=config['ARGON2_PARALLELISM']
+            )
+            _executor = _make_executor(config['PASSWORD_HASH_WORKERS'])
+        return _executor, _hasher
+
+
+def _run_timed(counter, label, func, *args):
+    """Runs func on the hashing pool and records the time, queueing included, that the request waited for it."""
+    executor, _ = _get_pool()
+    started = time.perf_counter()
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        elapsed = time.perf_counter() - started
+        current_app.logger.debug(f"Password {label} took {elapsed * 1000:.1f}ms")
+        with _stats_lock:
+            _hash_stats[counter] += 1
+            _hash_stats['total_seconds'] += elapsed
+            _hash_stats['max_seconds'] = max(_hash_stats['max_seconds'], elapsed)
+
+
+def hash_password(password):
+    """argon2id hash of `password`, computed on the bounded hashing pool."""
+    _, hasher = _get_pool()
+    return _run_timed('hashes', 'hashing', hasher.hash, password)
+
+
+def _verify(hasher, hashed_password, password):
+    if hashed_password.startswith('$argon2'):
+        try:
+            return hasher.verify(hashed_password, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    # Legacy werkzeug pbkdf2:sha256 hashes, upgraded on the next successful login
+    return check_password_hash(hashed_password, password)
+
+
+def verify_password(hashed_password, password):
+    if not hashed_password:
+        return False
+    _, hasher = _get_pool()
+    return _run_timed('verifications', 'verification', _verify, hasher, hashed_password, password)
+
+
+def needs_rehash(hashed_password):
+    """True for legacy (non-argon2) hashes and argon2 hashes made with other cost parameters."""
+    _, hasher = _get_pool()
+    if not hashed_password or not hashed_password.startswith('$argon2'):
+        return True
+    try:
+        return hasher.check_needs_rehash(hashed_password)
+    except InvalidHashError:
+        return True
+
+
+def record_rehash():
+    with _stats_lock:
+        _hash_stats['rehashes'] += 1
+
+
+def get_hash_stats():
+    with _stats_lock:
+        stats = dict(_hash_stats)
+    operations = stats['hashes'] + stats['verifications']
+    stats['avg_seconds'] = stats['total_seconds'] / operations if operations else 0.0
+    return stats
@@ -0,0 +1,319 @@
+from services.database_service import get_client, get_collection, supports_transactions, bump_collection_version
+from services.cache_service import user_cache, dashboard_cache
+from models.gig import Gig
+from models.user import User
+from pymongo import ReturnDocument, UpdateOne
+from bson.objectid import ObjectId
+from flask import current_app
+import datetime
+
+class PaymentError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def settle_gig(gig, employer, student):
+    """
+    Pays an ESCROWED gig out: moves gig.price from the employer's wallet (and committed funds)
+    to the student's wallet and marks the gig PAID.
+    Runs as one multi-document transaction on a replica set. On a standalone server it falls back to
+    conditional single-document updates, undoing the earlier steps if a later one fails or raises
+    (see _resolve_settlement; recover_settlements finishes off settlements a crash left half done).
+    Every balance change is a server-side $inc, so concurrent settlements never lose updates.
+    Returns (employer_wallet_balance, student_wallet_balance).
+    """
+    employer.ensure_committed_balance()
+    if supports_transactions():
+        balances = _settle_in_transaction(gig, employer, student)
+    else:
+        balances = _settle_with_compensation(gig, employer, student)
+    bump_collection_version(Gig.collection_name)
+    dashboard_cache.invalidate(gig.employer_id)
+    user_cache.invalidate(employer._id)
+    user_cache.invalidate(student._id)
+
+    gig.status = 'PAID'
+    gig._mark_persisted(status='PAID')
+    employer.wallet_balance, employer.committed_balance = balances[0]
+    employer._mark_persisted(wallet_balance=employer.wallet_balance)
+    student.wallet_balance = balances[1]
+    student._mark_persisted(wallet_balance=student.wallet_balance)
+    return employer.wallet_balance, student.wallet_balance
+
+
+def _escrowed_gig_query(gig, student):
+    return {'_id': gig._id, 'status': 'ESCROWED', 'claimed_by': str(student._id)}
+
+
+def _balance_update(increments, settlement_id=None):
+    """
+    $inc for a wallet change. Outside a transaction the settlement_id is recorded in the same atomic update
+    (pending_settlements), so a rollback can tell whether the change was applied even when the call raised.
+    """
+    update = {'$inc': {**increments, 'version': 1}}
+    if settlement_id is not None:
+        update['$addToSet'] = {'pending_settlements': settlement_id}
+    return update
+
+
+def _debit_employer(users_collection, employer, price, session=None, settlement_id=None):
+    return users_collection.find_one_and_update(
+        {'_id': employer._id, 'wallet_balance': {'$gte': price}},
+        _balance_update({'wallet_balance': -price, 'committed_balance': -price}, settlement_id),
+        projection={'wallet_balance': 1, 'committed_balance': 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+
+def _credit_student(users_collection, student, price, session=None, settlement_id=None):
+    return users_collection.find_one_and_update(
+        {'_id': student._id},
+        _balance_update({'wallet_balance': price}, settlement_id),
+        projection={'wallet_balance': 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+
+def _settle_in_transaction(gig, employer, student):
+    gigs_collection = get_collection(Gig.collection_name)
+    users_collection = get_collection(User.collection_name)
+
+    def transfer(session):
+        result = gigs_collection.update_one(_escrowed_gig_query(gig, student), {'$set': {'status': 'PAID'}, '$inc': {'version': 1}}, session=session)
+        if result.modified_count != 1:
+            raise PaymentError('Gig is not in an escrowed state for approval.')
+        employer_data = _debit_employer(users_collection, employer, gig.price, session=session)
+        if not employer_data:
+            raise PaymentError('Insufficient wallet balance to approve this payment.')
+        student_data = _credit_student(users_collection, student, gig.price, session=session)
+        if not student_data:
+            raise PaymentError('Assigned student not found.', status_code=404)
+        return (employer_data['wallet_balance'], employer_data['committed_balance']), student_data['wallet_balance']
+
+    with get_client().start_session() as session:
+        # with_transaction retries transient errors and aborts (re-raising) on PaymentError
+        return session.with_transaction(transfer)
+
+
+def _settle_with_compensation(gig, employer, student):
+    gigs_collection = get_collection(Gig.collection_name)
+    users_collection = get_collection(User.collection_name)
+
+    # Claiming the gig first means two concurrent approvals cannot both pay it out
+    settlement_id = ObjectId()
+    result = gigs_collection.update_one(_escrowed_gig_query(gig, student),
+                                        {'$set': {'status': 'SETTLING', 'settlement_id': settlement_id}, '$inc': {'version': 1}})
+    if result.modified_count != 1:
+        raise PaymentError('Gig is not in an escrowed state for approval.')
+
+    try:
+        employer_data = _debit_employer(users_collection, employer, gig.price, settlement_id=settlement_id)
+        if not employer_data:
+            raise PaymentError('Insufficient wallet balance to approve this payment.')
+        student_data = _credit_student(users_collection, student, gig.price, settlement_id=settlement_id)
+        if not student_data:
+            raise PaymentError('Assigned student not found.', status_code=404)
+        _mark_settlement_paid(gigs_collection, settlement_id)
+    except Exception:
+        _resolve_settlement(settlement_id, employer._id)
+        raise
+    _clear_settlement_markers(users_collection, settlement_id)
+    return (employer_data['wallet_balance'], employer_data['committed_balance']), student_data['wallet_balance']
+
+
+def _mark_settlement_paid(gigs_collection, settlement_id):
+    """The commit point of a settlement without transactions: once a gig of it is PAID, it is rolled forward."""
+    gigs_collection.update_many({'settlement_id': settlement_id, 'status': 'SETTLING'}, {'$set': {'status': 'PAID'}, '$inc': {'version': 1}})
+
+
+def _clear_settlement_markers(users_collection, settlement_id):
+    """Drops a finished settlement from pending_settlements. Best effort: recover_settlements clears leftovers."""
+    try:
+        users_collection.update_many({'pending_settlements': settlement_id}, {'$pull': {'pending_settlements': settlement_id}})
+    except Exception as e:
+        current_app.logger.warning(f"Could not clear settlement {settlement_id} from pending_settlements: {e}")
+
+
+def _resolve_settlement(settlement_id, employer_id):
+    """
+    Brings a settlement that did not run to completion (without transactions) to a consistent state.
+    If any of its gigs is PAID the payout went through and it is rolled forward. Otherwise it is undone in
+    reverse order: students' credits taken back, the employer refunded, then the gigs moved from SETTLING back
+    to ESCROWED. Each undo only matches a wallet whose pending_settlements still holds the settlement, so a
+    step that never applied is not undone and running this twice undoes nothing twice.
+    Returns the gigs' resulting status, 'PAID' or 'ESCROWED'.
+    """
+    gigs_collection = get_collection(Gig.collection_name)
+    users_collection = get_collection(User.collection_name)
+    gigs = list(gigs_collection.find({'settlement_id': settlement_id}, {'price': 1, 'claimed_by': 1, 'status': 1}))
+    if any(gig['status'] == 'PAID' for gig in gigs):
+        _mark_settlement_paid(gigs_collection, settlement_id)
+        _clear_settlement_markers(users_collection, settlement_id)
+        resolved = 'PAID'
+    else:
+        amounts = {}
+        for gig in gigs:
+            amounts[gig['claimed_by']] = amounts.get(gig['claimed_by'], 0.0) + gig['price']
+        for student_id, amount in amounts.items():
+            users_collection.update_one({'_id': ObjectId(student_id), 'pending_settlements': settlement_id},
+                                        {'$inc': {'wallet_balance': -amount, 'version': 1}, '$pull': {'pending_settlements': settlement_id}})
+            user_cache.invalidate(student_id)
+        total = sum(amounts.values())
+        users_collection.update_one({'_id': ObjectId(employer_id), 'pending_settlements': settlement_id},
+                                    {'$inc': {'wallet_balance': total, 'committed_balance': total, 'version': 1},
+                                     '$pull': {'pending_settlements': settlement_id}})
+        gigs_collection.update_many({'settlement_id': settlement_id, 'status': 'SETTLING'},
+                                    {'$set': {'status': 'ESCROWED'}, '$unset': {'settlement_id': ''}, '$inc': {'version': 1}})
+        resolved = 'ESCROWED'
+    user_cache.invalidate(employer_id)
+    bump_collection_version(Gig.collection_name)
+    dashboard_cache.invalidate(employer_id)
+    return resolved
+
+
+def recover_settlements(older_than_seconds=300):
+    """
+    Resolves (see _resolve_settlement) the settlements left SETTLING for longer than older_than_seconds by a
+    worker that crashed or was killed mid-payout, and clears pending_settlements markers a finished
+    settlement could not clear. Returns {'PAID': n, 'ESCROWED': n, 'unresolved': n} counted in settlements;
+    unresolved gigs are SETTLING gigs from before settlements were tagged, which need checking by hand.
+    """
+    gigs_collection = get_collection(Gig.collection_name)
+    users_collection = get_collection(User.collection_name)
+    # settlement_ids are ObjectIds, so their age is their generation time
+    cutoff = ObjectId.from_datetime(datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=older_than_seconds))
+    counts = {'PAID': 0, 'ESCROWED': 0, 'unresolved': 0}
+    stuck = gigs_collection.find({'status': 'SETTLING'}, {'settlement_id': 1, 'employer_id': 1})
+    settlements = {}
+    for gig in stuck:
+        if gig.get('settlement_id') is None:
+            counts['unresolved'] += 1
+        elif gig['settlement_id'] < cutoff:
+            settlements[gig['settlement_id']] = gig['employer_id']
+    for settlement_id, employer_id in settlements.items():
+        counts[_resolve_settlement(settlement_id, employer_id)] += 1
+
+    for user in users_collection.find({'pending_settlements.0': {'$exists': True}}, {'pending_settlements': 1}):
+        for settlement_id in user['pending_settlements']:
+            if settlement_id < cutoff and not gigs_collection.find_one({'settlement_id': settlement_id, 'status': 'SETTLING'}, {'_id': 1}):
+                _clear_settlement_markers(users_collection, settlement_id)
+    return counts
+
+
+def settle_gigs(gigs, employer):
+    """
+    settle_gig for many gigs of one employer, in a fixed number of round trips whatever the batch size:
+    one update_many claims every gig still ESCROWED for its student, one $inc debits the employer for all of
+    them and one bulk write credits each student once. `gigs` are Gig objects already checked to be the
+    employer's, ESCROWED and claimed. Gigs are paid in order while the employer's wallet covers them.
+    Returns {gig _id string: error message} for the gigs that were not paid; the others are marked PAID.
+    """
+    employer.ensure_committed_balance()
+    failures = {}
+    payable, total = [], 0.0
+    for gig in gigs:
+        if total + gig.price > employer.wallet_balance:
+            failures[str(gig._id)] = 'Insufficient wallet balance to approve this payment.'
+        else:
+            payable.append(gig)
+            total += gig.price
+    if not payable:
+        return failures
+
+    # Tags the claimed gigs so they can be found (and undone) as a batch; kept as a record of the payout
+    settlement_id = ObjectId()
+    try:
+        if supports_transactions():
+            claimed, employer_data, credited = _settle_batch_in_transaction(payable, employer, settlement_id)
+        else:
+            claimed, employer_data, credited = _settle_batch_with_compensation(payable, employer, settlement_id)
+    except PaymentError as e:
+        failures.update({str(gig._id): str(e) for gig in payable})
+        return failures
+
+    if claimed:
+        bump_collection_version(Gig.collection_name)
+        dashboard_cache.invalidate(employer._id)
+        user_cache.invalidate(employer._id)
+        for student_id in credited:
+            user_cache.invalidate(student_id)
+        employer.wallet_balance, employer.committed_balance = employer_data['wallet_balance'], employer_data['committed_balance']
+        employer._mark_persisted(wallet_balance=employer.wallet_balance)
+    for gig in payable:
+        if gig._id in claimed:
+            gig.status = 'PAID'
+            gig._mark_persisted(status='PAID')
+        else:
+            failures[str(gig._id)] = 'Gig is not in an escrowed state for approval.'
+    return failures
+
+
+def _claim_batch(gigs_collection, gigs, settlement_id, status, session=None):
+    """Moves the gigs still ESCROWED for their student to `status`; returns {_id: claimed gig document}."""
+    gigs_collection.update_many(
+        {'status': 'ESCROWED', '$or': [{'_id': gig._id, 'claimed_by': gig.claimed_by} for gig in gigs]},
+        {'$set': {'status': status, 'settlement_id': settlement_id}, '$inc': {'version': 1}},
+        session=session
+    )
+    claimed = gigs_collection.find({'settlement_id': settlement_id}, {'price': 1, 'claimed_by': 1}, session=session)
+    return {gig['_id']: gig for gig in claimed}
+
+
+def _credit_students(users_collection, claimed, session=None, settlement_id=None):
+    """Credits each student's share of the claimed gigs, one update per student."""
+    amounts = {}
+    for gig in claimed.values():
+        amounts[gig['claimed_by']] = amounts.get(gig['claimed_by'], 0.0) + gig['price']
+    result = users_collection.bulk_write(
+        [UpdateOne({'_id': ObjectId(student_id)}, _balance_update({'wallet_balance': amount}, settlement_id))
+         for student_id, amount in amounts.items()],
+        ordered=False,
+        session=session
+    )
+    return result.matched_count == len(amounts), list(amounts)
+
+
+def _settle_batch_in_transaction(gigs, employer, settlement_id):
+    gigs_collection = get_collection(Gig.collection_name)
+    users_collection = get_collection(User.collection_name)
+
+    def transfer(session):
+        claimed = _claim_batch(gigs_collection, gigs, settlement_id, 'PAID', session=session)
+        if not claimed:
+            return claimed, None, []
+        employer_data = _debit_employer(users_collection, employer, sum(gig['price'] for gig in claimed.values()), session=session)
+        if not employer_data:
+            raise PaymentError('Insufficient wallet balance to approve this payment.')
+        all_credited, credited = _credit_students(users_collection, claimed, session=session)
+        if not all_credited:
+            raise PaymentError('Assigned student not found.', status_code=404)
+        return claimed, employer_data, credited
+
+    with get_client().start_session() as session:
+        return session.with_transaction(transfer)
+
+
+def _settle_batch_with_compensation(gigs, employer, settlement_id):
+    gigs_collection = get_collection(Gig.collection_name)
+    users_collection = get_collection(User.collection_name)
+
+    claimed = _claim_batch(gigs_collection, gigs, settlement_id, 'SETTLING')
+    if not claimed:
+        return claimed, None, []
+
+    try:
+        employer_data = _debit_employer(users_collection, employer, sum(gig['price'] for gig in claimed.values()), settlement_id=settlement_id)
+        if not employer_data:
+            raise PaymentError('Insufficient wallet balance to approve this payment.')
+        all_credited, credited = _credit_students(users_collection, claimed, settlement_id=settlement_id)
+        if not all_credited:
+            raise PaymentError('Assigned student not found.', status_code=404)
+        _mark_settlement_paid(gigs_collection, settlement_id)
+    except Exception:
+        _resolve_settlement(settlement_id, employer._id)
+        raise
+    _clear_settlement_markers(users_collection, settlement_id)
+    return claimed, employer_data, credited
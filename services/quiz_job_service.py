@@ -0,0 +1,224 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from models.quiz import Quiz
+from models.quiz_job import QuizJob
+from models.quiz_bank import QuizBank
+from services.ai_service import generate_quiz, reserve_call_budget, AIServiceError
+import math
+import threading
+
+class QuizQueueFullError(Exception):
+    pass
+
+class QuizRateLimitedError(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Created lazily so each gunicorn worker gets its own pool after forking
+_executor = None
+_executor_lock = threading.Lock()
+_pending_jobs = 0
+# Bank keys with a refill queued or running in this process
+_refilling = set()
+# Generations queued or running in this process, by bank key: the jobs waiting on each besides its own
+_in_flight = {}
+_job_stats = {'generations': 0, 'coalesced': 0, 'rate_limited': 0, 'queue_full': 0}
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config['QUIZ_JOB_WORKERS'], thread_name_prefix='quiz-job')
+        return _executor
+
+
+def _reserve_slot(app):
+    global _pending_jobs
+    with _executor_lock:
+        if _pending_jobs >= app.config['QUIZ_JOB_MAX_PENDING']:
+            return False
+        _pending_jobs += 1
+        return True
+
+
+def get_quiz_job_stats():
+    with _executor_lock:
+        stats = dict(_job_stats)
+        stats['pending'] = _pending_jobs
+        stats['in_flight'] = len(_in_flight)
+    return stats
+
+
+def take_banked_quiz(student_id, primary_skill, target_skill_gap):
+    """
+    Serves a quiz from the quiz bank when the pair has a fresh variant: creates the student's Quiz from it
+    and returns it, or None on a miss. Queues a background refill when a hit leaves the pool below
+    QUIZ_BANK_LOW_WATER. A miss queues none: the caller's generation (submit_quiz_job) is about to fill the
+    bank, and every identical request meanwhile coalesces with it instead of each starting its own calls.
+    """
+    app = current_app._get_current_object()
+    if app.config['QUIZ_BANK_VARIANTS'] <= 0:
+        return None
+    bank_key = QuizBank.bank_key(primary_skill, target_skill_gap)
+    variant, fresh_count = QuizBank.take(bank_key, app.config['QUIZ_BANK_TTL_SECONDS'])
+    if not variant:
+        return None
+    if fresh_count < app.config['QUIZ_BANK_LOW_WATER']:
+        _schedule_refill(app, bank_key, primary_skill, target_skill_gap)
+    quiz = Quiz(skill_name=variant['skill_name'], questions=variant['questions'], student_id=student_id)
+    return quiz.save()
+
+
+def _schedule_refill(app, bank_key, primary_skill, target_skill_gap):
+    with _executor_lock:
+        # A generation in flight for the pair is already adding a variant
+        if bank_key in _refilling or bank_key in _in_flight:
+            return
+        _refilling.add(bank_key)
+    # Refills share the job and call budgets with students' requests and are simply dropped when they are used up
+    if not _reserve_slot(app):
+        with _executor_lock:
+            _refilling.discard(bank_key)
+        return
+    if reserve_call_budget():
+        _job_finished()
+        with _executor_lock:
+            _refilling.discard(bank_key)
+        return
+    _get_executor(app).submit(_run_refill, app, bank_key, primary_skill, target_skill_gap)
+
+
+def _run_refill(app, bank_key, primary_skill, target_skill_gap):
+    with app.app_context():
+        try:
+            missing = app.config['QUIZ_BANK_VARIANTS'] - QuizBank.fresh_count(bank_key, app.config['QUIZ_BANK_TTL_SECONDS'])
+            for variant in range(max(0, missing)):
+                # The first call was reserved by _schedule_refill
+                if variant and reserve_call_budget():
+                    break
+                quiz_data = generate_quiz(student_skills=[primary_skill], target_skill_gap=target_skill_gap)
+                QuizBank.add_variant(bank_key, quiz_data)
+            QuizBank.evict(app.config['QUIZ_BANK_TTL_SECONDS'], app.config['QUIZ_BANK_MAX_KEYS'])
+        except Exception as e:
+            app.logger.error(f"Quiz bank refill for '{bank_key}' failed: {e}")
+        finally:
+            with _executor_lock:
+                _refilling.discard(bank_key)
+            _job_finished()
+
+
+def _admit(app, bank_key, job=None):
+    """
+    Decides, under the lock, how a generation for bank_key is served: 'coalesced' when one is already in flight
+    (`job`, if given, is attached to it), 'leader' when a new one may start (with `job`, a pool slot and a provider
+    call are reserved and the flight is opened), or raises QuizRateLimitedError / QuizQueueFullError.
+    Called once without a job before the job is stored, to turn requests away without any write.
+    """
+    global _pending_jobs
+    with _executor_lock:
+        if bank_key in _in_flight:
+            if job is not None:
+                _in_flight[bank_key].append(job)
+                _job_stats['coalesced'] += 1
+            return 'coalesced'
+        if _pending_jobs >= app.config['QUIZ_JOB_MAX_PENDING']:
+            _job_stats['queue_full'] += 1
+            raise QuizQueueFullError("Too many quizzes are being generated right now. Try again shortly.")
+        retry_after = reserve_call_budget(peek=job is None)
+        if retry_after:
+            _job_stats['rate_limited'] += 1
+            raise QuizRateLimitedError("Quiz generation is rate limited right now. Try again shortly.", math.ceil(retry_after))
+        if job is None:
+            return 'leader'
+        _pending_jobs += 1
+        _in_flight[bank_key] = []
+        return 'leader'
+
+
+def submit_quiz_job(student_id, primary_skill, target_skill_gap):
+    """
+    Records a PENDING QuizJob and queues it on the bounded background pool. Returns the job right away;
+    the AI provider is only ever called from the pool, never from a request worker.
+    Concurrent requests for the same (primary_skill, target_skill_gap) share one generation (single flight):
+    only the first starts one, the others are attached to it and finish with it.
+    A new generation needs a pool slot (QUIZ_JOB_MAX_PENDING per process, else QuizQueueFullError) and a provider
+    call from the budget (else QuizRateLimitedError, with the seconds until one is available). Nothing waits.
+    """
+    app = current_app._get_current_object()
+    bank_key = QuizBank.bank_key(primary_skill, target_skill_gap)
+    _admit(app, bank_key)
+
+    job = QuizJob(student_id=student_id, primary_skill=primary_skill, target_skill_gap=target_skill_gap).insert()
+    try:
+        admission = _admit(app, bank_key, job)
+    except (QuizQueueFullError, QuizRateLimitedError) as e:
+        job.mark_failed(str(e))
+        raise
+    if admission == 'leader':
+        try:
+            _get_executor(app).submit(_run_quiz_job, app, bank_key, job)
+        except Exception:
+            _finish_flight(bank_key)
+            _job_finished()
+            raise
+    return job
+
+
+def _finish_flight(bank_key):
+    """Closes the flight for bank_key, returning the jobs that were attached to it."""
+    with _executor_lock:
+        return _in_flight.pop(bank_key, [])
+
+
+def _job_finished():
+    global _pending_jobs
+    with _executor_lock:
+        _pending_jobs -= 1
+
+
+def _run_quiz_job(app, bank_key, job):
+    with app.app_context():
+        try:
+            job.mark_running()
+            quiz_data = generate_quiz(
+                student_skills=[job.primary_skill],
+                target_skill_gap=job.target_skill_gap
+            )
+            with _executor_lock:
+                _job_stats['generations'] += 1
+            if app.config['QUIZ_BANK_VARIANTS'] > 0:
+                QuizBank.add_variant(bank_key, quiz_data)
+        except AIServiceError as e:
+            app.logger.error(f"AI Service Error in quiz job {job._id}: {e}")
+            _fail_jobs([job] + _finish_flight(bank_key), f'Failed to generate quiz: {e}')
+            return
+        except Exception as e:
+            app.logger.error(f"An unexpected error occurred in quiz job {job._id}: {e}")
+            _fail_jobs([job] + _finish_flight(bank_key), 'An unexpected error occurred while generating the quiz.')
+            return
+        finally:
+            _job_finished()
+
+        # Every job attached to the flight gets its own copy of the generated quiz
+        for waiting_job in [job] + _finish_flight(bank_key):
+            try:
+                quiz = Quiz(
+                    skill_name=quiz_data['skill_name'],
+                    questions=quiz_data['questions'],
+                    student_id=waiting_job.student_id
+                )
+                quiz.save()
+                waiting_job.mark_done(quiz._id)
+            except Exception as e:
+                app.logger.error(f"Could not store the quiz for job {waiting_job._id}: {e}")
+                _fail_jobs([waiting_job], 'An unexpected error occurred while generating the quiz.')
+
+
+def _fail_jobs(jobs, error):
+    for job in jobs:
+        try:
+            job.mark_failed(error)
+        except Exception as e:
+            current_app.logger.error(f"Could not mark quiz job {job._id} failed: {e}")
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+from services.database_service import get_client
+import threading
+import time
+
+# Warm-up runs once per process; _health is the last GET /ready check, reused for READY_CACHE_SECONDS
+_warmup = {'state': 'pending', 'seconds': None, 'indexes': None, 'error': None}
+_warmup_lock = threading.Lock()
+_health = {'checked_at': None, 'result': None}
+_health_lock = threading.Lock()
+
+
+def start_warmup(app: Flask):
+    """Runs warm_up on a background thread, so the worker can take requests while it runs."""
+    threading.Thread(target=warm_up, args=(app,), name='warm-up', daemon=True).start()
+
+
+def warm_up(app: Flask):
+    """
+    Gets this worker ready for traffic, once: opens READY_WARM_CONNECTIONS pooled MongoDB connections (concurrent
+    pings each check out their own), creates and verifies the indexes when MONGO_ENSURE_INDEXES, backfills skill_key
+    on gigs stored before it existed (a no-op once done), then runs the first page of the gig listing so its
+    index pages are in the server's cache.
+    Returns the warm-up state. A failed warm-up is retried by the next call.
+    """
+    with _warmup_lock:
+        if _warmup['state'] == 'done':
+            return dict(_warmup)
+        _warmup['state'] = 'running'
+        started = time.perf_counter()
+        try:
+            with app.app_context():
+                client = get_client()
+                connections = max(1, app.config['READY_WARM_CONNECTIONS'])
+                with ThreadPoolExecutor(max_workers=connections) as pool:
+                    list(pool.map(lambda _: client.admin.command('ping'), range(connections)))
+
+                if app.config['MONGO_ENSURE_INDEXES']:
+                    from services.index_service import ensure_indexes, verify_indexes
+                    ensure_indexes()
+                    _warmup['indexes'] = 'verified' if verify_indexes() else 'missing'
+
+                from models.skill import SkillIndex
+                backfilled = SkillIndex.backfill_skill_keys()
+                if backfilled:
+                    app.logger.info(f"Backfilled skill_key on {backfilled} gigs.")
+
+                from models.gig import Gig
+                Gig.find_page(limit=app.config['GIGS_PAGE_DEFAULT_LIMIT'])
+            _warmup.update(state='done', error=None)
+        except Exception as e:
+            app.logger.error(f"Warm-up failed, it will be retried by GET /ready: {e}")
+            _warmup.update(state='failed', error=str(e))
+        _warmup['seconds'] = round(time.perf_counter() - started, 3)
+        if _warmup['state'] == 'done':
+            app.logger.info(f"Warm-up finished in {_warmup['seconds']:.2f}s.")
+        return dict(_warmup)
+
+
+def check_ready(app: Flask):
+    """
+    Readiness for GET /ready: (ready, details). Warms up the worker on first use (a warm-up already running
+    is reported, not waited for), then pings MongoDB at most once every READY_CACHE_SECONDS; requests in
+    between get the cached result.
+    """
+    warmup = dict(_warmup) if _warmup['state'] in ('done', 'running') else warm_up(app)
+    with _health_lock:
+        checked_at = _health['checked_at']
+        if checked_at is None or time.monotonic() - checked_at > app.config['READY_CACHE_SECONDS']:
+            started = time.perf_counter()
+            try:
+                with app.app_context():
+                    get_client().admin.command('ping')
+                mongo = {'ok': True, 'ms': round((time.perf_counter() - started) * 1000, 1)}
+            except Exception as e:
+                mongo = {'ok': False, 'error': str(e)}
+            _health.update(checked_at=time.monotonic(), result=mongo)
+        mongo = _health['result']
+    ready = warmup['state'] == 'done' and mongo['ok']
+    return ready, {'status': 'ready' if ready else 'unavailable', 'mongo': mongo, 'warmup': warmup}
@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+import importlib
+import time
+
+# (step, seconds) for each timed step of create_app, in order
+_steps = []
+
+
+@contextmanager
+def startup_step(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _steps.append((name, time.perf_counter() - started))
+
+
+def timed_import(module_name):
+    """
+    Imports a module, timing it as a startup step. Like `python -X importtime`, the time includes every module
+    it imports that was not loaded yet, so it is charged to the first module that needs it.
+    """
+    with startup_step(f"import {module_name}"):
+        return importlib.import_module(module_name)
+
+
+def get_startup_profile():
+    """{step: seconds}, also exported on /metrics."""
+    return {name: round(seconds, 6) for name, seconds in _steps}
+
+
+def log_startup_profile(logger):
+    total = sum(seconds for _, seconds in _steps)
+    lines = [f"  {seconds * 1000:8.1f} ms  {name}" for name, seconds in sorted(_steps, key=lambda step: -step[1])]
+    logger.info("Startup profile (%.1f ms in timed steps):\n%s", total * 1000, "\n".join(lines))